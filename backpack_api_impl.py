@@ -1,79 +1,1651 @@
+import array
 import asyncio
+import bisect
+import collections
+import heapq
 import hmac
 import hashlib
 import json
 import logging
+import math
+import queue
+import random
+import threading
 import time
-from typing import Dict, List, Optional, Any, Callable, Union
+import urllib.parse
+import uuid
+from typing import Dict, Iterable, List, Optional, Any, Awaitable, Callable, Hashable, Tuple, Union
 import aiohttp
 import websockets
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 请求优先级，数值越小越优先
+PRIORITY_ORDER = 0        # 下单、撤单
+PRIORITY_MARKET = 1       # 行情、深度
+PRIORITY_ACCOUNT = 2      # 余额、持仓、挂单查询
+PRIORITY_BACKGROUND = 3   # 健康检查等后台请求
+
+
+# 可以安全重试的HTTP方法
+IDEMPOTENT_METHODS = ("GET", "HEAD", "DELETE")
+
+
+class RequestShed(Exception):
+    """低优先级请求在接近限流时被丢弃"""
+
+
+class AccountReadError(Exception):
+    """账户数据读取失败(请求出错、被限流丢弃或熔断)，与空仓、零余额区分"""
+
+
+class TickRing:
+    """定长的逐笔价格环形缓冲区
+
+    时间、价格、成交量分别存放在double数组中。每个值同时写入位置i和i+capacity，
+    因此最近n条数据总是一段连续内存，可以直接返回memoryview而无需拷贝，追加为O(1)。
+    返回的视图会随后续写入变化，需要长期保存时请自行拷贝。
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = max(1, int(capacity))
+        size = self.capacity * 2
+        self._times = array.array("d", bytes(8 * size))
+        self._prices = array.array("d", bytes(8 * size))
+        self._volumes = array.array("d", bytes(8 * size))
+        self._next = 0
+        self.count = 0
+
+    def append(self, timestamp: float, price: float, volume: float = 0.0):
+        """追加一条数据，缓冲区满时覆盖最旧的数据"""
+        index = self._next
+        mirror = index + self.capacity
+        self._times[index] = self._times[mirror] = timestamp
+        self._prices[index] = self._prices[mirror] = price
+        self._volumes[index] = self._volumes[mirror] = volume
+        self._next = (index + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def window(self, n: Optional[int] = None) -> Tuple[memoryview, memoryview, memoryview]:
+        """返回最近n条数据的时间、价格、成交量视图，按时间从旧到新排列
+
+        Args:
+            n: 条数，默认为全部已有数据
+        """
+        n = self.count if n is None else max(0, min(n, self.count))
+        end = self._next + self.capacity
+        start = end - n
+        return (
+            memoryview(self._times)[start:end],
+            memoryview(self._prices)[start:end],
+            memoryview(self._volumes)[start:end]
+        )
+
+    def since(self, timestamp: float) -> Tuple[memoryview, memoryview, memoryview]:
+        """返回时间不早于timestamp的数据视图"""
+        times = self.window()[0]
+        return self.window(self.count - bisect.bisect_left(times, timestamp))
+
+    def latest(self) -> Optional[Tuple[float, float, float]]:
+        """最新一条数据(时间, 价格, 成交量)"""
+        if self.count == 0:
+            return None
+        index = self._next - 1 + self.capacity
+        return self._times[index], self._prices[index], self._volumes[index]
+
 
 class PriceCache:
-    """价格缓存类，用于存储和获取最新价格"""
-    def __init__(self):
+    """价格缓存类，用于存储和获取最新价格及其更新时间
+
+    每个交易对另外保留最近history_size条价格记录，供需要历史数据的模块直接读取。
+    """
+    def __init__(self, history_size: int = 1024):
+        self.history_size = history_size
         self._prices = {}
-        
-    def update(self, symbol: str, price: float):
-        """更新特定交易对的价格"""
+        self._updated = {}
+        self._history = {}
+
+    def update(self, symbol: str, price: float, timestamp: Optional[float] = None, volume: float = 0.0):
+        """更新特定交易对的价格
+
+        Args:
+            symbol: 交易对名称
+            price: 最新价格
+            timestamp: 价格时间(time.time()秒)，默认为当前时间
+            volume: 成交量
+        """
+        timestamp = time.time() if timestamp is None else timestamp
         self._prices[symbol] = price
-        
-    def get(self, symbol: str, default: float = 0) -> float:
-        """获取特定交易对的价格"""
+        self._updated[symbol] = timestamp
+
+        ring = self._history.get(symbol)
+        if ring is None:
+            ring = self._history[symbol] = TickRing(self.history_size)
+        ring.append(timestamp, price, volume)
+
+    def history(self, symbol: str, n: Optional[int] = None) -> Tuple[memoryview, memoryview, memoryview]:
+        """获取最近n条价格记录的时间、价格、成交量视图
+
+        Args:
+            symbol: 交易对名称
+            n: 条数，默认为全部
+
+        Returns:
+            三个等长的memoryview，没有记录时为空
+        """
+        ring = self._history.get(symbol)
+        if ring is None:
+            empty = memoryview(array.array("d"))
+            return empty, empty, empty
+        return ring.window(n)
+
+    def history_since(self, symbol: str, seconds: float) -> Tuple[memoryview, memoryview, memoryview]:
+        """获取最近seconds秒内的价格记录视图"""
+        ring = self._history.get(symbol)
+        if ring is None:
+            empty = memoryview(array.array("d"))
+            return empty, empty, empty
+        return ring.since(time.time() - seconds)
+
+    def is_stale(self, symbol: str, max_age: float) -> bool:
+        """价格是否已超过max_age秒未更新"""
+        return self.age(symbol) > max_age
+
+    def get(self, symbol: str, default: float = 0, max_age: Optional[float] = None) -> float:
+        """获取特定交易对的价格
+
+        Args:
+            symbol: 交易对名称
+            default: 没有价格或价格过旧时的返回值
+            max_age: 允许的最大价格年龄(秒)，None表示不限制
+
+        Returns:
+            价格
+        """
+        if max_age is not None and self.is_stale(symbol, max_age):
+            return default
         return self._prices.get(symbol, default)
-    
+
+    def age(self, symbol: str) -> float:
+        """距离上次更新的秒数，从未更新时为无穷大"""
+        updated = self._updated.get(symbol)
+        if updated is None:
+            return float("inf")
+        return time.time() - updated
+
     def get_all(self) -> Dict[str, float]:
         """获取所有交易对的价格"""
         return self._prices.copy()
 
 
+class CandleSeries:
+    """单个交易对、单个周期的K线序列
+
+    当前K线以普通属性保存，每笔价格O(1)更新；收盘的K线写入定长数组，
+    与TickRing相同采用双写布局，最近n根K线可以零拷贝读取。
+    """
+
+    FIELDS = ("time", "open", "high", "low", "close", "volume")
+
+    def __init__(self, interval: float, history: int = 500):
+        self.interval = float(interval)
+        self.capacity = max(1, int(history))
+        size = self.capacity * 2
+        self._columns = {field: array.array("d", bytes(8 * size)) for field in self.FIELDS}
+        self._next = 0
+        self.count = 0
+        self._bar = None  # 当前未收盘的K线: [开始时间, 开, 高, 低, 收, 量]
+
+    def _close_bar(self, bar: List[float]):
+        """把一根K线写入历史"""
+        index = self._next
+        mirror = index + self.capacity
+        for field, value in zip(self.FIELDS, bar):
+            column = self._columns[field]
+            column[index] = column[mirror] = value
+        self._next = (index + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def update(self, timestamp: float, price: float, volume: float = 0.0) -> int:
+        """合并一笔价格
+
+        Args:
+            timestamp: 时间(秒)
+            price: 价格
+            volume: 本笔成交量
+
+        Returns:
+            本次收盘的K线数量，没有成交的周期以前收盘价补齐
+        """
+        start = timestamp - timestamp % self.interval
+        bar = self._bar
+        if bar is None:
+            self._bar = [start, price, price, price, price, volume]
+            return 0
+
+        if start <= bar[0]:
+            # 同一周期(或乱序的旧价格)直接合并到当前K线
+            if price > bar[2]:
+                bar[2] = price
+            if price < bar[3]:
+                bar[3] = price
+            bar[4] = price
+            bar[5] += volume
+            return 0
+
+        self._close_bar(bar)
+        closed = 1
+        # 中间没有成交的周期，最多补齐history根
+        missing = int(round((start - bar[0]) / self.interval)) - 1
+        last_close = bar[4]
+        for step in range(min(missing, self.capacity)):
+            gap_start = start - (min(missing, self.capacity) - step) * self.interval
+            self._close_bar([gap_start, last_close, last_close, last_close, last_close, 0.0])
+            closed += 1
+        self._bar = [start, price, price, price, price, volume]
+        return closed
+
+    def current(self) -> Optional[Dict[str, float]]:
+        """当前未收盘的K线"""
+        if self._bar is None:
+            return None
+        return dict(zip(self.FIELDS, self._bar))
+
+    def closed(self, n: Optional[int] = None) -> Dict[str, memoryview]:
+        """最近n根已收盘K线的各字段视图，按时间从旧到新排列
+
+        Args:
+            n: 根数，默认为全部
+        """
+        n = self.count if n is None else max(0, min(n, self.count))
+        end = self._next + self.capacity
+        return {field: memoryview(column)[end - n:end] for field, column in self._columns.items()}
+
+    def last_closed(self) -> Optional[Dict[str, float]]:
+        """最近一根已收盘的K线"""
+        if self.count == 0:
+            return None
+        index = self._next - 1 + self.capacity
+        return {field: column[index] for field, column in self._columns.items()}
+
+
+class CandleAggregator:
+    """由逐笔价格同时生成多个周期的OHLCV K线"""
+
+    DEFAULT_TIMEFRAMES = {"1s": 1, "1m": 60, "5m": 300, "1h": 3600}
+
+    def __init__(self, timeframes: Optional[Dict[str, float]] = None, history: int = 500):
+        self.timeframes = dict(timeframes or self.DEFAULT_TIMEFRAMES)
+        self.history = history
+        self._series = {}
+        self._last_volume = {}
+
+    def on_tick(self, symbol: str, timestamp: float, price: float, volume: float = 0.0, cumulative: bool = False):
+        """合并一笔价格到该交易对的所有周期
+
+        Args:
+            symbol: 交易对名称
+            timestamp: 时间(秒)
+            price: 价格
+            volume: 成交量
+            cumulative: volume是否为累计量(如ticker的24小时成交量)，是则按差值计入
+        """
+        if cumulative:
+            previous = self._last_volume.get(symbol)
+            self._last_volume[symbol] = volume
+            # 累计量回落说明统计窗口滚动，本笔不计量
+            volume = volume - previous if previous is not None and volume >= previous else 0.0
+
+        series = self._series.get(symbol)
+        if series is None:
+            series = self._series[symbol] = {
+                name: CandleSeries(interval, self.history) for name, interval in self.timeframes.items()
+            }
+        for candle in series.values():
+            candle.update(timestamp, price, volume)
+
+    def series(self, symbol: str, timeframe: str) -> Optional[CandleSeries]:
+        """获取K线序列，没有数据时返回None"""
+        return self._series.get(symbol, {}).get(timeframe)
+
+    def current(self, symbol: str, timeframe: str) -> Optional[Dict[str, float]]:
+        """当前未收盘的K线"""
+        series = self.series(symbol, timeframe)
+        return series.current() if series else None
+
+    def closed(self, symbol: str, timeframe: str, n: Optional[int] = None) -> Dict[str, memoryview]:
+        """最近n根已收盘K线的各字段视图"""
+        series = self.series(symbol, timeframe)
+        if series is None:
+            empty = memoryview(array.array("d"))
+            return {field: empty for field in CandleSeries.FIELDS}
+        return series.closed(n)
+
+
+class OrderBook:
+    """本地维护的L2订单簿
+
+    由REST深度快照加增量推送构建。每条增量带有首末更新ID(U/u)，
+    相邻两条必须首尾相接，出现缺口时标记为未同步，由调用方重新拉取快照。
+    价格档位保存在有序列表中，最优价和累计深度的读取不需要网络请求。
+    """
+
+    def __init__(self, symbol: str, max_buffer: int = 1000):
+        self.symbol = symbol
+        self.max_buffer = max_buffer
+        self.bids = {}
+        self.asks = {}
+        self._bid_prices = []   # 升序，最优买价在末尾
+        self._ask_prices = []   # 升序，最优卖价在开头
+        self.last_update_id = None
+        self.synced = False
+        self.updated_at = 0.0
+        self.resyncs = 0
+        self._buffer = []
+
+    def reset(self):
+        """清空订单簿，等待新的快照"""
+        self.bids.clear()
+        self.asks.clear()
+        self._bid_prices.clear()
+        self._ask_prices.clear()
+        self.last_update_id = None
+        self.synced = False
+        self._buffer.clear()
+
+    @staticmethod
+    def _set_level(levels: Dict[float, float], prices: List[float], price: float, quantity: float):
+        """更新单个价格档位，数量为0时删除"""
+        if quantity > 0:
+            if price not in levels:
+                bisect.insort(prices, price)
+            levels[price] = quantity
+        elif price in levels:
+            del levels[price]
+            index = bisect.bisect_left(prices, price)
+            if index < len(prices) and prices[index] == price:
+                del prices[index]
+
+    def _apply_levels(self, bids: Iterable, asks: Iterable):
+        """批量更新档位"""
+        for price, quantity in bids:
+            self._set_level(self.bids, self._bid_prices, float(price), float(quantity))
+        for price, quantity in asks:
+            self._set_level(self.asks, self._ask_prices, float(price), float(quantity))
+        self.updated_at = time.time()
+
+    def apply_snapshot(self, snapshot: Dict):
+        """应用REST深度快照，并重放快照之后缓存的增量
+
+        Args:
+            snapshot: /api/v1/depth 的返回，包含bids、asks和lastUpdateId
+        """
+        buffered, self._buffer = self._buffer, []
+        self.reset()
+        self._apply_levels(snapshot.get("bids", []), snapshot.get("asks", []))
+        self.last_update_id = int(snapshot.get("lastUpdateId", 0))
+        self.synced = True
+        for first_id, last_id, bids, asks in buffered:
+            if last_id <= self.last_update_id:
+                continue
+            if not self.apply_diff(first_id, last_id, bids, asks):
+                break
+
+    def apply_diff(self, first_id: int, last_id: int, bids: Iterable, asks: Iterable) -> bool:
+        """应用一条增量推送
+
+        Args:
+            first_id: 本条增量的首个更新ID(U)
+            last_id: 本条增量的最后更新ID(u)
+            bids: 买单档位变更
+            asks: 卖单档位变更
+
+        Returns:
+            是否成功应用，False表示出现序号缺口需要重新同步
+        """
+        if not self.synced:
+            # 等待快照期间先缓存增量
+            if len(self._buffer) >= self.max_buffer:
+                self._buffer.pop(0)
+            self._buffer.append((first_id, last_id, bids, asks))
+            return True
+
+        if last_id <= self.last_update_id:
+            return True  # 快照已包含的旧增量
+
+        if first_id > self.last_update_id + 1:
+            self.synced = False
+            self.resyncs += 1
+            return False
+
+        self._apply_levels(bids, asks)
+        self.last_update_id = last_id
+        return True
+
+    def best_bid(self) -> Optional[Tuple[float, float]]:
+        """最优买价及数量"""
+        if not self._bid_prices:
+            return None
+        price = self._bid_prices[-1]
+        return price, self.bids[price]
+
+    def best_ask(self) -> Optional[Tuple[float, float]]:
+        """最优卖价及数量"""
+        if not self._ask_prices:
+            return None
+        price = self._ask_prices[0]
+        return price, self.asks[price]
+
+    def levels(self, side: str, count: int) -> List[Tuple[float, float]]:
+        """按从优到劣的顺序返回一侧的前count档
+
+        Args:
+            side: 'bids'或'asks'
+            count: 档位数量
+        """
+        if side == "bids":
+            prices = self._bid_prices[-count:][::-1] if count > 0 else []
+            return [(price, self.bids[price]) for price in prices]
+        prices = self._ask_prices[:count]
+        return [(price, self.asks[price]) for price in prices]
+
+    def sweep_price(self, side: str, quantity: float) -> Optional[float]:
+        """吃掉指定数量所需到达的最差价格
+
+        Args:
+            side: 下单方向，'BUY'吃卖单，'SELL'吃买单
+            quantity: 数量
+
+        Returns:
+            价格，深度不足时返回None
+        """
+        if side == "BUY":
+            prices, levels = self._ask_prices, self.asks
+            ordered = prices
+        else:
+            prices, levels = self._bid_prices, self.bids
+            ordered = reversed(prices)
+
+        filled = 0.0
+        for price in ordered:
+            filled += levels[price]
+            if filled >= quantity:
+                return price
+        return None
+
+    def age(self) -> float:
+        """距离上次更新的秒数"""
+        return time.time() - self.updated_at if self.updated_at else float("inf")
+
+
+class JsonCodec:
+    """JSON编解码器，优先使用orjson，未安装时回退到标准库"""
+
+    def __init__(self, backend: str = "auto"):
+        if backend == "auto":
+            backend = "orjson" if orjson is not None else "json"
+        if backend == "orjson" and orjson is None:
+            raise ValueError("未安装orjson，无法使用该JSON编解码器")
+        self.backend = backend
+
+    def dumps(self, obj: Any) -> bytes:
+        """序列化为紧凑的UTF-8字节串"""
+        if self.backend == "orjson":
+            return orjson.dumps(obj)
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def loads(self, data) -> Any:
+        """反序列化字节串或字符串"""
+        if self.backend == "orjson":
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+class HttpTransport:
+    """HTTP传输层，管理长连接池、DNS缓存、分端点超时和连接预热"""
+
+    DEFAULT_OPTIONS = {
+        "pool_size": 20,
+        "pool_size_per_host": 10,
+        "keepalive_timeout": 60,
+        "dns_cache_ttl": 300,
+        "connect_timeout": 3,
+        "default_timeout": 10,
+        "warmup_connections": 2,
+        "warmup_path": "/api/v1/status",
+        "endpoint_timeouts": {}
+    }
+
+    def __init__(self, base_url: str, logger: logging.Logger, options: Optional[Dict] = None):
+        self.base_url = base_url
+        self.logger = logger
+        self.options = dict(self.DEFAULT_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.session = None
+        self._connector = None
+        self._timeouts = {}
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.requests_sent = 0
+
+    def _build_trace_config(self) -> aiohttp.TraceConfig:
+        """统计新建连接与复用连接的次数"""
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            self.requests_sent += 1
+
+        async def on_connection_create_end(session, context, params):
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self.connections_reused += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """获取或创建带连接池的HTTP会话"""
+        if self.session is None or self.session.closed:
+            self._connector = aiohttp.TCPConnector(
+                limit=self.options["pool_size"],
+                limit_per_host=self.options["pool_size_per_host"],
+                keepalive_timeout=self.options["keepalive_timeout"],
+                ttl_dns_cache=self.options["dns_cache_ttl"],
+                use_dns_cache=True,
+                enable_cleanup_closed=True
+            )
+            self.session = aiohttp.ClientSession(
+                connector=self._connector,
+                timeout=self.timeout_for(None),
+                trace_configs=[self._build_trace_config()]
+            )
+        return self.session
+
+    def timeout_for(self, endpoint: Optional[str]) -> aiohttp.ClientTimeout:
+        """获取端点对应的超时设置"""
+        total = self.options["endpoint_timeouts"].get(endpoint, self.options["default_timeout"])
+        timeout = self._timeouts.get(total)
+        if timeout is None:
+            timeout = aiohttp.ClientTimeout(
+                total=total,
+                connect=min(total, self.options["connect_timeout"])
+            )
+            self._timeouts[total] = timeout
+        return timeout
+
+    async def warm_up(self) -> int:
+        """预先建立连接，避免首笔交易承担TCP/TLS握手开销，返回成功预热的连接数"""
+        session = await self.get_session()
+        count = self.options["warmup_connections"]
+        if count <= 0:
+            return 0
+
+        url = f"{self.base_url}{self.options['warmup_path']}"
+
+        async def touch():
+            async with session.get(url, timeout=self.timeout_for(None)) as response:
+                await response.read()
+
+        # 并发请求才能同时占用多个连接，请求结束后连接回到池中保持长连接
+        results = await asyncio.gather(*(touch() for _ in range(count)), return_exceptions=True)
+        warmed = sum(1 for result in results if not isinstance(result, Exception))
+        if warmed < count:
+            self.logger.warning(f"连接预热部分失败: {warmed}/{count}")
+        else:
+            self.logger.info(f"连接预热完成: {warmed} 个连接")
+        return warmed
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """获取连接池使用情况"""
+        stats = {
+            "limit": self.options["pool_size"],
+            "limit_per_host": self.options["pool_size_per_host"],
+            "in_use": 0,
+            "idle": 0,
+            "requests": self.requests_sent,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused
+        }
+        connector = self._connector
+        if connector is not None and not connector.closed:
+            stats["in_use"] = len(getattr(connector, "_acquired", ()))
+            stats["idle"] = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        return stats
+
+    async def close(self):
+        """关闭HTTP会话及连接池"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self._connector = None
+
+
+class RequestScheduler:
+    """令牌桶限流器与优先级请求队列
+
+    所有REST请求在发送前需要获取令牌，令牌不足时按优先级排队，
+    下单和撤单总是排在查询请求之前。低优先级请求只能使用保留额度之外的令牌，
+    排队过长或等待超时时直接丢弃。
+    """
+
+    DEFAULT_OPTIONS = {
+        "rate": 10.0,                    # 每秒补充的令牌数
+        "burst": 20,                     # 令牌桶容量
+        "max_concurrency": 10,           # 最大并发请求数
+        "reserve_tokens": 3,             # 为下单和行情保留的令牌数
+        "low_priority": PRIORITY_ACCOUNT,  # 大于等于该优先级的请求可被延迟或丢弃
+        "shed_queue_depth": 20,          # 低优先级排队数量上限
+        "max_wait": 5.0                  # 低优先级请求最长等待时间(秒)
+    }
+
+    def __init__(self, logger: logging.Logger, options: Optional[Dict] = None):
+        self.logger = logger
+        self.options = dict(self.DEFAULT_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.tokens = float(self.options["burst"])
+        self._updated = time.monotonic()
+        self._waiters = []
+        self._seq = 0
+        self._in_flight = 0
+        self._timer = None
+        self.granted = 0
+        self.delayed = 0
+        self.shed = 0
+
+    def _refill(self):
+        """按时间补充令牌"""
+        now = time.monotonic()
+        self.tokens = min(
+            float(self.options["burst"]),
+            self.tokens + (now - self._updated) * self.options["rate"]
+        )
+        self._updated = now
+
+    def _threshold(self, priority: int) -> float:
+        """获取令牌所需的最低余量，低优先级请求不能动用保留令牌"""
+        if priority >= self.options["low_priority"]:
+            return 1 + self.options["reserve_tokens"]
+        return 1
+
+    def _try_grant(self, priority: int) -> bool:
+        """尝试立即发放令牌"""
+        self._refill()
+        if self._in_flight < self.options["max_concurrency"] and self.tokens >= self._threshold(priority):
+            self.tokens -= 1
+            self._in_flight += 1
+            self.granted += 1
+            return True
+        return False
+
+    def _low_priority_waiting(self) -> int:
+        """统计排队中的低优先级请求数量"""
+        low = self.options["low_priority"]
+        return sum(1 for priority, _, fut in self._waiters if priority >= low and not fut.done())
+
+    def _dispatch(self):
+        """按优先级唤醒排队的请求，令牌不足时安排下一次唤醒"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._waiters:
+            priority, _, fut = self._waiters[0]
+            if fut.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._try_grant(priority):
+                break
+            heapq.heappop(self._waiters)
+            fut.set_result(None)
+
+        # 并发已满时等待release唤醒，否则等待令牌补充
+        if self._waiters and self._in_flight < self.options["max_concurrency"]:
+            deficit = self._threshold(self._waiters[0][0]) - self.tokens
+            delay = max(deficit / self.options["rate"], 0.001)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    async def acquire(self, priority: int = PRIORITY_ACCOUNT):
+        """获取发送请求的许可
+
+        Args:
+            priority: 请求优先级
+
+        Raises:
+            RequestShed: 低优先级请求被丢弃
+        """
+        if not self._waiters and self._try_grant(priority):
+            return
+
+        is_low = priority >= self.options["low_priority"]
+        if is_low and self._low_priority_waiting() >= self.options["shed_queue_depth"]:
+            self.shed += 1
+            raise RequestShed("请求过多，低优先级请求已丢弃")
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, self._seq, fut))
+        self._seq += 1
+        self.delayed += 1
+        self._dispatch()
+
+        try:
+            if is_low and self.options["max_wait"]:
+                await asyncio.wait_for(asyncio.shield(fut), self.options["max_wait"])
+            else:
+                await fut
+        except asyncio.TimeoutError:
+            # 超时的同时恰好获得许可，则照常发送
+            if fut.done() and not fut.cancelled():
+                return
+            fut.cancel()
+            self.shed += 1
+            raise RequestShed("等待限流超时，低优先级请求已丢弃")
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()
+            else:
+                fut.cancel()
+            raise
+
+    def pause(self, seconds: float):
+        """暂停发放令牌，用于交易所返回429时整体退让"""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.options["rate"]
+        self.logger.warning(f"交易所限流，暂停发送请求 {seconds:.2f} 秒")
+
+    def release(self):
+        """请求结束后归还并发名额"""
+        self._in_flight -= 1
+        if self._waiters:
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取限流器状态"""
+        self._refill()
+        return {
+            "tokens": round(self.tokens, 2),
+            "in_flight": self._in_flight,
+            "waiting": sum(1 for _, _, fut in self._waiters if not fut.done()),
+            "granted": self.granted,
+            "delayed": self.delayed,
+            "shed": self.shed
+        }
+
+
+class RetryPolicy:
+    """带抖动的指数退避重试策略"""
+
+    DEFAULT_OPTIONS = {
+        "max_attempts": 3,                            # 包含首次请求在内的最大尝试次数
+        "base_delay": 0.2,                            # 退避基准时间(秒)
+        "max_delay": 5.0,                             # 单次退避上限(秒)
+        "retry_statuses": [429, 500, 502, 503, 504],  # 可重试的HTTP状态码
+        "endpoint_attempts": {}                       # 按端点覆盖最大尝试次数
+    }
+
+    def __init__(self, options: Optional[Dict] = None):
+        self.options = dict(self.DEFAULT_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.retries = 0
+
+    def attempts_for(self, endpoint: str) -> int:
+        """获取端点的最大尝试次数"""
+        return max(1, self.options["endpoint_attempts"].get(endpoint, self.options["max_attempts"]))
+
+    def is_retryable_status(self, status: int) -> bool:
+        """状态码是否值得重试"""
+        return status in self.options["retry_statuses"]
+
+    def backoff(self, attempt: int) -> float:
+        """计算第attempt次失败后的等待时间（full jitter）
+
+        Args:
+            attempt: 已失败次数，从0开始
+
+        Returns:
+            等待秒数
+        """
+        ceiling = min(self.options["max_delay"], self.options["base_delay"] * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """熔断器，交易所连续出错时快速失败，冷却后放行单个探测请求"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    DEFAULT_OPTIONS = {
+        "failure_threshold": 5,   # 连续失败多少次后熔断
+        "reset_timeout": 10.0     # 熔断持续时间(秒)，之后进入半开状态
+    }
+
+    def __init__(self, logger: logging.Logger, options: Optional[Dict] = None):
+        self.logger = logger
+        self.options = dict(self.DEFAULT_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """是否允许发出请求"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.options["reset_timeout"]:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        # 半开状态只放行一个探测请求
+        if self._probe_in_flight:
+            self.rejected += 1
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def abandon(self):
+        """放行的请求最终没有发出，不计入成功或失败"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        """记录一次成功"""
+        if self.state != self.CLOSED:
+            self.logger.info("交易所连接恢复，熔断器关闭")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        """记录一次失败"""
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.options["failure_threshold"]:
+            if self.state != self.OPEN:
+                self.logger.warning(
+                    f"交易所连续失败 {self.failures} 次，熔断 {self.options['reset_timeout']} 秒"
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取熔断器状态"""
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+class RollingHistogram:
+    """保留最近N个样本的滚动分布，按需计算分位数"""
+
+    def __init__(self, window: int = 1024):
+        self._samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        """记录一个样本"""
+        self._samples.append(value)
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentiles(self, *quantiles: float) -> List[float]:
+        """计算窗口内样本的分位数（最近秩法）"""
+        if not self._samples:
+            return [0.0 for _ in quantiles]
+        ordered = sorted(self._samples)
+        last = len(ordered) - 1
+        return [ordered[min(last, int(q * len(ordered)))] for q in quantiles]
+
+    def summary(self) -> Dict[str, float]:
+        """获取p50/p95/p99等统计"""
+        p50, p95, p99 = self.percentiles(0.5, 0.95, 0.99)
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 2) if self.count else 0.0,
+            "p50": round(p50, 2),
+            "p95": round(p95, 2),
+            "p99": round(p99, 2),
+            "max": round(self.max, 2)
+        }
+
+
+class EndpointMetrics:
+    """按端点统计请求延迟、排队时间、状态码和流量，延迟单位为毫秒"""
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._endpoints = {}
+        self.loop_lag = RollingHistogram(window)
+
+    def _get(self, method: str, endpoint: str) -> Dict[str, Any]:
+        """获取或创建端点的统计项"""
+        key = f"{method} {endpoint}"
+        stats = self._endpoints.get(key)
+        if stats is None:
+            stats = {
+                "latency": RollingHistogram(self.window),
+                "queue_wait": RollingHistogram(self.window),
+                "statuses": collections.Counter(),
+                "bytes_sent": 0,
+                "bytes_received": 0
+            }
+            self._endpoints[key] = stats
+        return stats
+
+    def record(self, method: str, endpoint: str, latency: float, status: Union[int, str],
+               bytes_sent: int = 0, bytes_received: int = 0):
+        """记录一次请求
+
+        Args:
+            method: HTTP方法
+            endpoint: API端点，不含查询字符串
+            latency: 从发出请求到读完响应的耗时(秒)
+            status: HTTP状态码，未收到响应时为异常类型名称
+            bytes_sent: 请求体字节数
+            bytes_received: 响应体字节数
+        """
+        stats = self._get(method, endpoint)
+        stats["latency"].add(latency * 1000)
+        stats["statuses"][str(status)] += 1
+        stats["bytes_sent"] += bytes_sent
+        stats["bytes_received"] += bytes_received
+
+    def record_queue_wait(self, method: str, endpoint: str, wait: float):
+        """记录在限流器中排队的时间(秒)"""
+        self._get(method, endpoint)["queue_wait"].add(wait * 1000)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """获取所有端点的统计快照"""
+        result = {}
+        for key, stats in self._endpoints.items():
+            result[key] = {
+                "latency_ms": stats["latency"].summary(),
+                "queue_wait_ms": stats["queue_wait"].summary(),
+                "statuses": dict(stats["statuses"]),
+                "bytes_sent": stats["bytes_sent"],
+                "bytes_received": stats["bytes_received"]
+            }
+        result["event_loop_lag"] = {"lag_ms": self.loop_lag.summary()}
+        return result
+
+
+class ClockSync:
+    """跟踪本地时钟与交易所服务器时钟的偏差，用于生成签名时间戳
+
+    每个样本记录请求发出和收到响应的本地时间，服务器时间视为发生在往返的中点，
+    偏差取往返时间最短（最可信）的样本。
+    """
+
+    DEFAULT_OPTIONS = {
+        "recv_window": 5000,      # 请求有效窗口(毫秒)，通过X-WINDOW发送
+        "sync_interval": 300,     # 重新同步的间隔(秒)
+        "samples": 5,             # 每次同步的采样次数
+        "max_rtt": 2000,          # 往返时间超过该值(毫秒)的样本丢弃
+        "path": "/api/v1/time"
+    }
+
+    def __init__(self, logger: logging.Logger, options: Optional[Dict] = None):
+        self.logger = logger
+        self.options = dict(self.DEFAULT_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.offset_ms = 0.0
+        self.rtt_ms = None
+        self.last_sync = 0.0
+        self._samples = collections.deque(maxlen=max(1, self.options["samples"]) * 2)
+
+    @property
+    def recv_window(self) -> int:
+        """请求有效窗口(毫秒)"""
+        return int(self.options["recv_window"])
+
+    def now_ms(self) -> int:
+        """按服务器时间校正后的当前毫秒时间戳"""
+        return int(time.time() * 1000 + self.offset_ms)
+
+    def add_sample(self, sent_ms: float, server_ms: float, received_ms: float) -> bool:
+        """加入一个测量样本
+
+        Args:
+            sent_ms: 请求发出时的本地时间(毫秒)
+            server_ms: 服务器返回的时间(毫秒)
+            received_ms: 收到响应时的本地时间(毫秒)
+
+        Returns:
+            样本是否被采用
+        """
+        rtt = received_ms - sent_ms
+        if rtt < 0 or rtt > self.options["max_rtt"]:
+            return False
+        self._samples.append((rtt, server_ms - (sent_ms + received_ms) / 2))
+        self.rtt_ms, self.offset_ms = min(self._samples)
+        self.last_sync = time.monotonic()
+        return True
+
+    def is_stale(self) -> bool:
+        """是否需要重新同步"""
+        return not self.last_sync or time.monotonic() - self.last_sync >= self.options["sync_interval"]
+
+    def invalidate(self):
+        """服务器拒绝时间戳后丢弃旧样本，强制重新同步"""
+        self._samples.clear()
+        self.last_sync = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """获取时钟同步状态"""
+        return {
+            "offset_ms": round(self.offset_ms, 1),
+            "rtt_ms": None if self.rtt_ms is None else round(self.rtt_ms, 1),
+            "recv_window": self.recv_window
+        }
+
+
+class SingleFlight:
+    """合并并发的相同请求，同一时刻相同的键只有一个请求在途，其他调用者共享其结果"""
+
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """执行或加入一个在途请求
+
+        Args:
+            key: 请求的唯一键
+            factory: 创建请求协程的函数，只有第一个调用者会执行
+
+        Returns:
+            请求结果，所有并发调用者得到同一个对象
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        # shield保证单个调用者被取消时不会取消其他调用者共享的请求
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        """请求完成后移除记录"""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        """获取合并统计"""
+        return {"in_flight": len(self._calls), "coalesced": self.coalesced}
+
+
+class ResponseCache:
+    """账户类GET请求的读缓存，每个端点有独立的TTL
+
+    下单、撤单或成交时按端点失效。每个端点维护一个代数，
+    失效前发出的请求返回后不会写回缓存，避免旧数据覆盖新状态。
+    """
+
+    DEFAULT_TTLS = {
+        "/api/v1/capital": 2.0,
+        "/api/v1/positions": 1.0,
+        "/api/v1/open-orders": 1.0
+    }
+
+    # 订单状态变化后需要失效的端点
+    ACCOUNT_ENDPOINTS = ("/api/v1/capital", "/api/v1/positions", "/api/v1/open-orders")
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None):
+        self.ttls = dict(self.DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self._entries = {}
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def is_cacheable(self, endpoint: str) -> bool:
+        """端点是否启用缓存"""
+        return self.ttls.get(endpoint, 0) > 0
+
+    def generation(self, endpoint: str) -> int:
+        """获取端点当前的缓存代数"""
+        return self._generations.get(endpoint, 0)
+
+    def get(self, key: tuple) -> Optional[Any]:
+        """获取未过期的缓存结果，key的第一个元素为端点"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: tuple, value: Any, generation: int):
+        """写入缓存，请求期间端点已失效则丢弃"""
+        endpoint = key[0]
+        if generation != self.generation(endpoint):
+            return
+        self._entries[key] = (time.monotonic() + self.ttls[endpoint], value)
+
+    def invalidate(self, *endpoints: str):
+        """使指定端点的缓存失效，不指定时清空全部"""
+        targets = endpoints or tuple(self.ttls)
+        for endpoint in targets:
+            self._generations[endpoint] = self.generation(endpoint) + 1
+        self._entries = {key: entry for key, entry in self._entries.items() if key[0] not in targets}
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, int]:
+        """获取缓存命中统计"""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations
+        }
+
+
+class FrameDecoder:
+    """WebSocket消息解码器
+
+    把原始消息解析为(stream, channel, symbol, payload)元组，ticker的payload预先转换为
+    (价格, 成交量)浮点元组，其余频道为原始data字典。
+    启用线程模式后解码在独立线程中进行，按接收顺序通过队列交回事件循环，
+    行情突发时事件循环只需处理解析好的元组。
+    """
+
+    def __init__(self, codec: JsonCodec, logger: logging.Logger):
+        self.codec = codec
+        self.logger = logger
+        self._frames = queue.Queue()
+        self._output = None
+        self._loop = None
+        self._thread = None
+        self.decoded = 0
+        self.errors = 0
+        self.max_backlog = 0
+
+    @staticmethod
+    def parse_message(message: Any) -> Optional[Tuple[str, str, str, Any]]:
+        """解析已反序列化的推送消息，非行情消息(如订阅确认)返回None"""
+        if not isinstance(message, dict):
+            return None
+        stream = message.get("stream")
+        data = message.get("data")
+        if not stream or not isinstance(data, dict):
+            return None
+        channel, _, symbol = stream.partition(".")
+        symbol = data.get("s", symbol)
+        if channel == "ticker" and "c" in data:  # c: 最新成交价, v: 24小时成交量
+            return stream, channel, symbol, (float(data["c"]), float(data.get("v", 0)))
+        return stream, channel, symbol, data
+
+    def parse(self, frame: Union[str, bytes]) -> Optional[Tuple[str, str, str, Any]]:
+        """反序列化并解析一条原始消息"""
+        return self.parse_message(self.codec.loads(frame))
+
+    @property
+    def threaded(self) -> bool:
+        """解码线程是否在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动解码线程，需在事件循环中调用"""
+        if self.threaded:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._output = asyncio.Queue()
+        self._thread = threading.Thread(target=self._run, name="ws-decoder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """通知解码线程退出"""
+        if self.threaded:
+            self._frames.put(None)
+        self._thread = None
+
+    def submit(self, frame: Union[str, bytes]):
+        """提交一条原始消息，立即返回"""
+        self._frames.put(frame)
+        backlog = self._frames.qsize()
+        if backlog > self.max_backlog:
+            self.max_backlog = backlog
+
+    async def get(self) -> Tuple[str, str, str, Any]:
+        """按接收顺序获取解析结果"""
+        return await self._output.get()
+
+    def _run(self):
+        """解码线程主循环"""
+        while True:
+            frame = self._frames.get()
+            if frame is None:
+                return
+            try:
+                item = self.parse(frame)
+            except Exception as e:
+                self.errors += 1
+                self.logger.error(f"解码WebSocket消息失败: {e}")
+                continue
+            self.decoded += 1
+            if item is not None:
+                try:
+                    self._loop.call_soon_threadsafe(self._output.put_nowait, item)
+                except RuntimeError:
+                    return  # 事件循环已关闭
+
+    def stats(self) -> Dict[str, Any]:
+        """获取解码统计"""
+        return {
+            "threaded": self.threaded,
+            "decoded": self.decoded,
+            "errors": self.errors,
+            "backlog": self._frames.qsize(),
+            "max_backlog": self.max_backlog
+        }
+
+
+class StreamHealth:
+    """WebSocket连接健康状态
+
+    负责重连退避(带抖动的指数退避，连接稳定一段时间后重置)、心跳参数，
+    以及连接断开期间的降级时长统计。
+    """
+
+    DEFAULT_OPTIONS = {
+        "ping_interval": 10.0,          # 心跳间隔(秒)
+        "ping_timeout": 5.0,            # 心跳无响应即判定为半开连接(秒)
+        "idle_timeout": 30.0,           # 长时间收不到任何消息时主动重连(秒)
+        "reconnect_base_delay": 0.5,    # 重连退避基准(秒)
+        "reconnect_max_delay": 30.0,    # 重连退避上限(秒)
+        "stable_after": 30.0            # 连接保持多久后重置退避(秒)
+    }
+
+    def __init__(self, options: Optional[Dict] = None):
+        self.options = dict(self.DEFAULT_OPTIONS)
+        if options:
+            self.options.update({k: v for k, v in options.items() if k in self.DEFAULT_OPTIONS})
+        self.backoff_policy = RetryPolicy({
+            "base_delay": self.options["reconnect_base_delay"],
+            "max_delay": self.options["reconnect_max_delay"]
+        })
+        self.failures = 0
+        self.connections = 0
+        self.disconnects = 0
+        self.connected_at = None
+        self.degraded_since = None
+        self.degraded_seconds = 0.0
+
+    def on_connected(self):
+        """连接建立"""
+        now = time.monotonic()
+        if self.degraded_since is not None:
+            self.degraded_seconds += now - self.degraded_since
+            self.degraded_since = None
+        self.connections += 1
+        self.connected_at = now
+
+    def on_disconnected(self) -> float:
+        """连接断开或建立失败，返回重连前需要等待的秒数"""
+        now = time.monotonic()
+        if self.connected_at is not None:
+            self.disconnects += 1
+            if now - self.connected_at >= self.options["stable_after"]:
+                self.failures = 0
+        self.connected_at = None
+        if self.degraded_since is None:
+            self.degraded_since = now
+        delay = self.backoff_policy.backoff(self.failures)
+        self.failures += 1
+        return delay
+
+    def degraded_time(self) -> float:
+        """累计降级时长(秒)，包含当前仍在进行的断线"""
+        current = time.monotonic() - self.degraded_since if self.degraded_since is not None else 0.0
+        return self.degraded_seconds + current
+
+    def stats(self) -> Dict[str, Any]:
+        """获取连接统计"""
+        return {
+            "connected": self.connected_at is not None,
+            "connections": self.connections,
+            "disconnects": self.disconnects,
+            "consecutive_failures": self.failures,
+            "degraded_seconds": round(self.degraded_time(), 3)
+        }
+
+
+class PriceDispatcher:
+    """合并式价格回调分发器
+
+    每个回调拥有独立的邮箱和后台任务。邮箱按交易对只保留最新价格，
+    回调处理较慢时新价格覆盖旧价格(计为合并)，不会积压，也不会阻塞WebSocket接收循环。
+    """
+
+    def __init__(self, logger: logging.Logger, slow_threshold: float = 1.0):
+        self.logger = logger
+        self.slow_threshold = slow_threshold
+        self._consumers = []
+        self.published = 0
+        self.delivered = 0
+        self.conflated = 0
+        self.errors = 0
+        self.slow_calls = 0
+
+    def add(self, callback: Callable[[str, float], Any]):
+        """添加回调，首次发布时启动其后台任务"""
+        self._consumers.append({
+            "callback": callback,
+            "pending": {},
+            "event": asyncio.Event(),
+            "task": None
+        })
+
+    def publish(self, symbol: str, price: float):
+        """投递价格更新，立即返回
+
+        Args:
+            symbol: 交易对名称
+            price: 最新价格
+        """
+        self.published += 1
+        for consumer in self._consumers:
+            pending = consumer["pending"]
+            if symbol in pending:
+                self.conflated += 1
+            pending[symbol] = price
+            consumer["event"].set()
+            task = consumer["task"]
+            if task is None or task.done():
+                consumer["task"] = asyncio.create_task(self._run(consumer))
+
+    async def _run(self, consumer: Dict):
+        """单个回调的分发循环"""
+        callback = consumer["callback"]
+        event = consumer["event"]
+        while True:
+            await event.wait()
+            event.clear()
+            batch, consumer["pending"] = consumer["pending"], {}
+            for symbol, price in batch.items():
+                started = time.monotonic()
+                try:
+                    result = callback(symbol, price)
+                    if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+                        await result
+                    self.delivered += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.errors += 1
+                    self.logger.error(f"调用价格回调失败: {e}")
+                elapsed = time.monotonic() - started
+                if elapsed > self.slow_threshold:
+                    self.slow_calls += 1
+                    self.logger.warning(f"价格回调耗时 {elapsed:.2f}s，期间的价格已合并为最新值")
+
+    async def close(self):
+        """停止所有后台任务"""
+        tasks = [c["task"] for c in self._consumers if c["task"] and not c["task"].done()]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        for consumer in self._consumers:
+            consumer["task"] = None
+
+    def stats(self) -> Dict[str, int]:
+        """获取分发统计"""
+        return {
+            "consumers": len(self._consumers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "conflated": self.conflated,
+            "errors": self.errors,
+            "slow_calls": self.slow_calls,
+            "pending": sum(len(c["pending"]) for c in self._consumers)
+        }
+
+
+class SubscriptionManager:
+    """管理WebSocket订阅的频道集合
+
+    频道名格式为"<channel>.<symbol>"，例如"ticker.SOL_USDC_PERP"。
+    连接在线时增减订阅直接发送SUBSCRIBE/UNSUBSCRIBE，无需重连；
+    重连后通过attach重新订阅完整集合。
+    "account."开头的私有频道单独发送，订阅时附带signer生成的签名。
+    """
+
+    PRIVATE_PREFIX = "account."
+
+    def __init__(self, codec: JsonCodec, logger: logging.Logger, signer: Optional[Callable[[], List[str]]] = None):
+        self.codec = codec
+        self.logger = logger
+        self.signer = signer
+        self.streams = set()
+        self._ws = None
+        self._request_id = 0
+
+    @staticmethod
+    def stream_name(channel: str, symbol: str) -> str:
+        """生成频道名"""
+        return f"{channel}.{symbol}"
+
+    async def _send(self, method: str, streams: Iterable[str]):
+        """向在线连接发送订阅变更"""
+        if self._ws is None:
+            return
+        params = sorted(streams)
+        public = [stream for stream in params if not stream.startswith(self.PRIVATE_PREFIX)]
+        private = [stream for stream in params if stream.startswith(self.PRIVATE_PREFIX)]
+        for group, signed in ((public, False), (private, True)):
+            if not group:
+                continue
+            self._request_id += 1
+            message = {"method": method, "params": group, "id": self._request_id}
+            if signed and method == "SUBSCRIBE" and self.signer is not None:
+                message["signature"] = self.signer()
+            await self._ws.send(self.codec.dumps(message).decode())
+            self.logger.info(f"WebSocket {method}: {group}")
+
+    async def attach(self, ws):
+        """连接建立后订阅当前集合"""
+        self._ws = ws
+        await self._send("SUBSCRIBE", self.streams)
+
+    def detach(self):
+        """连接断开"""
+        self._ws = None
+
+    async def subscribe(self, *streams: str):
+        """增加订阅"""
+        added = set(streams) - self.streams
+        self.streams |= added
+        await self._send("SUBSCRIBE", added)
+
+    async def unsubscribe(self, *streams: str):
+        """取消订阅"""
+        removed = set(streams) & self.streams
+        self.streams -= removed
+        await self._send("UNSUBSCRIBE", removed)
+
+    def symbols(self, channel: str) -> List[str]:
+        """获取某个频道已订阅的交易对"""
+        prefix = f"{channel}."
+        return sorted(stream[len(prefix):] for stream in self.streams if stream.startswith(prefix))
+
+
 class BackpackAPI:
-    """Backpack交易所API封装类"""
+    """Backpack交易所API封装类，交易机器人与配置菜单共用"""
+
+    # 订单的终结状态，到达后不会再有成交
+    ORDER_FINAL_STATUSES = ("Filled", "Cancelled", "Expired")
+    # 批量下单每个请求的最大订单数
+    MAX_BATCH_ORDERS = 20
+    # 市场参数中查不到交易对时，缓存这一结果的时间(秒)
+    MARKETS_MISS_TTL = 60
+    # 账户推送频道：订单状态与持仓变化
+    ACCOUNT_STREAMS = ("account.orderUpdate", "account.positionUpdate")
     def __init__(
-        self, 
-        api_key: str, 
-        api_secret: str, 
+        self,
+        api_key: str,
+        api_secret: str,
         base_url: str = "https://api.backpack.exchange",
-        ws_url: str = "wss://ws.backpack.exchange", 
-        logger: Optional[logging.Logger] = None
+        ws_url: str = "wss://ws.backpack.exchange",
+        logger: Optional[logging.Logger] = None,
+        network_options: Optional[Dict] = None,
+        json_codec: Optional[JsonCodec] = None,
+        rate_limit_options: Optional[Dict] = None,
+        cache_ttls: Optional[Dict[str, float]] = None,
+        retry_options: Optional[Dict] = None,
+        breaker_options: Optional[Dict] = None,
+        metrics_window: int = 1024,
+        clock_options: Optional[Dict] = None,
+        price_max_age: float = 3.0,
+        orderbook_depth: int = 100,
+        price_history_size: int = 1024,
+        stream_options: Optional[Dict] = None,
+        candle_options: Optional[Dict] = None
     ):
         """初始化API客户端
-        
+
         Args:
             api_key: API密钥
             api_secret: API密钥对应的秘密
             base_url: API基础URL，默认为正式网
             ws_url: WebSocket URL
             logger: 日志记录器，如果为None则创建新的
+            network_options: HTTP连接池与超时配置，参见HttpTransport.DEFAULT_OPTIONS
+            json_codec: JSON编解码器，默认自动选择
+            rate_limit_options: 限流配置，参见RequestScheduler.DEFAULT_OPTIONS
+            cache_ttls: 各端点的读缓存TTL(秒)，参见ResponseCache.DEFAULT_TTLS
+            retry_options: 重试配置，参见RetryPolicy.DEFAULT_OPTIONS
+            breaker_options: 熔断配置，参见CircuitBreaker.DEFAULT_OPTIONS
+            metrics_window: 每个端点保留的延迟样本数
+            clock_options: 时钟同步配置，参见ClockSync.DEFAULT_OPTIONS
+            price_max_age: 缓存价格的最大可用年龄(秒)，超过后回退到REST查询
+            orderbook_depth: 本地订单簿快照拉取的档位数
+            price_history_size: 每个交易对保留的价格记录条数
+            stream_options: WebSocket重连与心跳配置，参见StreamHealth.DEFAULT_OPTIONS
+            candle_options: K线配置，timeframes为周期名到秒数的映射，history为每个周期保留的根数
         """
         self.api_key = api_key
         self.api_secret = api_secret.encode()
         self.base_url = base_url
         self.ws_url = ws_url
         self.logger = logger or logging.getLogger("backpack_api")
-        
+
+        # HTTP传输层
+        self.transport = HttpTransport(base_url, self.logger, network_options)
+        self.codec = json_codec or JsonCodec()
+        self.session = None
+        self.scheduler = RequestScheduler(self.logger, rate_limit_options)
+        self.single_flight = SingleFlight()
+        self.cache = ResponseCache(cache_ttls)
+        self.retry_policy = RetryPolicy(retry_options)
+        self.breaker = CircuitBreaker(self.logger, breaker_options)
+        self.metrics = EndpointMetrics(metrics_window)
+        self.metrics_task = None
+        self.clock = ClockSync(self.logger, clock_options)
+        self._clock_task = None
+
         # 价格缓存
-        self.prices = PriceCache()
-        
+        self.prices = PriceCache(price_history_size)
+        self.price_max_age = price_max_age
+
+        # 由推送价格生成的K线
+        candle_options = candle_options or {}
+        self.candles = CandleAggregator(candle_options.get("timeframes"), candle_options.get("history", 500))
+
         # WebSocket连接
         self.ws_connection = None
         self.ws_task = None
-        self.price_callbacks = []
-        
-        # 会话
-        self._session = None
-    
-    async def _get_session(self) -> aiohttp.ClientSession:
-        """获取或创建HTTP会话"""
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession()
-        return self._session
-    
+        self.stream_health = StreamHealth(stream_options)
+        self._refill_task = None
+        # 可选：在独立线程中解码推送消息，减少行情突发时事件循环的占用
+        self.decoder = FrameDecoder(self.codec, self.logger)
+        self.decode_in_thread = bool((stream_options or {}).get("decode_in_thread", False))
+        self._decoded_task = None
+        self.price_dispatcher = PriceDispatcher(self.logger)
+        self.subscriptions = SubscriptionManager(self.codec, self.logger, signer=self._ws_signature)
+        # 按频道分发推送数据，data为消息中的data字段
+        self._stream_handlers = {
+            "ticker": self._on_ticker,
+            "depth": self._on_depth,
+            "account": self._on_account
+        }
+
+        # 账户推送：最近的订单状态、等待成交的调用者，以及由推送维护的持仓
+        self.order_events = collections.OrderedDict()
+        self.max_order_events = 1000
+        self._order_waiters = {}
+        self.stream_positions = {}
+        self.positions_synced = False
+        self.account_callbacks = []
+        self._position_sync_task = None
+
+        # 本地订单簿
+        self.orderbooks = {}
+        self.orderbook_depth = orderbook_depth
+
+        # 交易对的价格精度和数量精度，市场参数基本不变，首次查询后常驻内存；
+        # 未知交易对或查询失败后MARKETS_MISS_TTL秒内不再重新拉取全部市场
+        self._tick_sizes = {}
+        self._step_sizes = {}
+        self._markets_fetched_at = None
+        self._orderbook_tasks = {}
+
+    async def initialize(self, warm_up: bool = False) -> "BackpackAPI":
+        """初始化HTTP会话
+
+        Args:
+            warm_up: 是否预热连接池
+
+        Returns:
+            API客户端自身
+        """
+        if self.session is None or self.session.closed:
+            self.session = await self.transport.get_session()
+            if warm_up:
+                await self.transport.warm_up()
+                await self.sync_clock()
+        return self
+
     async def close(self):
         """关闭所有连接"""
-        if self._session and not self._session.closed:
-            await self._session.close()
-        
+        if self.metrics_task and not self.metrics_task.done():
+            self.metrics_task.cancel()
+            try:
+                await self.metrics_task
+            except asyncio.CancelledError:
+                pass
+        self.metrics_task = None
+
+        if self._clock_task and not self._clock_task.done():
+            self._clock_task.cancel()
+        self._clock_task = None
+
         # 关闭WebSocket连接
         if self.ws_task and not self.ws_task.done():
             self.ws_task.cancel()
@@ -81,200 +1653,585 @@ class BackpackAPI:
                 await self.ws_task
             except asyncio.CancelledError:
                 pass
-        
+
         if self.ws_connection:
             try:
                 await self.ws_connection.close()
             except Exception:
                 pass
-    
-    def _generate_signature(self, timestamp: int, method: str, path: str, body: str = "") -> str:
+            self.ws_connection = None
+
+        for task in self._orderbook_tasks.values():
+            if not task.done():
+                task.cancel()
+        self._orderbook_tasks.clear()
+
+        if self._position_sync_task and not self._position_sync_task.done():
+            self._position_sync_task.cancel()
+        self._position_sync_task = None
+
+        if self._refill_task and not self._refill_task.done():
+            self._refill_task.cancel()
+        self._refill_task = None
+
+        if self._decoded_task and not self._decoded_task.done():
+            self._decoded_task.cancel()
+        self._decoded_task = None
+        self.decoder.stop()
+
+        await self.price_dispatcher.close()
+
+        await self.transport.close()
+        self.session = None
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """获取HTTP连接池使用情况"""
+        return self.transport.pool_stats()
+
+    def scheduler_stats(self) -> Dict[str, Any]:
+        """获取限流器使用情况"""
+        return self.scheduler.stats()
+
+    def single_flight_stats(self) -> Dict[str, int]:
+        """获取并发请求合并情况"""
+        return self.single_flight.stats()
+
+    def cache_stats(self) -> Dict[str, int]:
+        """获取读缓存命中情况"""
+        return self.cache.stats()
+
+    def resilience_stats(self) -> Dict[str, Any]:
+        """获取重试与熔断情况"""
+        stats = self.breaker.stats()
+        stats["retries"] = self.retry_policy.retries
+        return stats
+
+    def stream_stats(self) -> Dict[str, Any]:
+        """获取WebSocket连接与降级情况"""
+        return self.stream_health.stats()
+
+    def dispatch_stats(self) -> Dict[str, int]:
+        """获取价格回调分发情况"""
+        return self.price_dispatcher.stats()
+
+    def metrics_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """获取各端点的延迟、状态码和流量统计"""
+        return self.metrics.snapshot()
+
+    async def _metrics_reporter(self, interval: float, sample_interval: float):
+        """定期采样事件循环延迟，并按间隔输出端点统计"""
+        loop = asyncio.get_running_loop()
+        next_report = loop.time() + interval
+        while True:
+            expected = loop.time() + sample_interval
+            await asyncio.sleep(sample_interval)
+            # 实际唤醒时间与预期的差值即事件循环被阻塞的时间
+            self.metrics.loop_lag.add(max(0.0, loop.time() - expected) * 1000)
+
+            if loop.time() >= next_report:
+                next_report = loop.time() + interval
+                for key, stats in self.metrics_snapshot().items():
+                    self.logger.info(f"请求统计 {key}: {stats}")
+                if self.price_dispatcher.published:
+                    self.logger.info(f"价格分发统计: {self.dispatch_stats()}")
+                if self.stream_health.connections:
+                    self.logger.info(f"WebSocket连接统计: {self.stream_stats()}")
+                    self.logger.info(f"WebSocket解码统计: {self.decoder.stats()}")
+
+    def start_metrics_reporter(self, interval: float = 300, sample_interval: float = 1.0):
+        """启动统计输出任务
+
+        Args:
+            interval: 输出统计的间隔(秒)
+            sample_interval: 事件循环延迟的采样间隔(秒)
+        """
+        if self.metrics_task is None or self.metrics_task.done():
+            self.metrics_task = asyncio.create_task(self._metrics_reporter(interval, sample_interval))
+
+    async def sync_clock(self) -> bool:
+        """测量本地时钟与服务器时钟的偏差
+
+        Returns:
+            是否至少获得一个有效样本
+        """
+        session = await self.transport.get_session()
+        path = self.clock.options["path"]
+        accepted = 0
+        for _ in range(max(1, self.clock.options["samples"])):
+            try:
+                sent_ms = time.time() * 1000
+                async with session.get(f"{self.base_url}{path}", timeout=self.transport.timeout_for(path)) as response:
+                    raw = await response.read()
+                received_ms = time.time() * 1000
+                server_time = self.codec.loads(raw)
+                if isinstance(server_time, dict):
+                    server_time = server_time.get("serverTime", 0)
+                if self.clock.add_sample(sent_ms, float(server_time), received_ms):
+                    accepted += 1
+            except Exception as e:
+                self.logger.warning(f"同步服务器时间失败: {e!r}")
+                break
+
+        if accepted:
+            self.logger.info(f"服务器时间已同步: {self.clock.stats()}")
+        return accepted > 0
+
+    def _maybe_resync_clock(self):
+        """时钟同步过期时在后台重新同步，不阻塞当前请求"""
+        if self.clock.is_stale() and (self._clock_task is None or self._clock_task.done()):
+            self._clock_task = asyncio.create_task(self.sync_clock())
+
+    @staticmethod
+    def _is_timestamp_rejection(status: int, result: Any) -> bool:
+        """判断请求是否因时间戳超出有效窗口被拒绝"""
+        if status not in (400, 401):
+            return False
+        text = str(result).lower()
+        return "timestamp" in text or "window" in text or "expired" in text
+
+    def invalidate_account_cache(self):
+        """订单状态变化（下单、成交、撤单）后使账户类缓存失效"""
+        self.cache.invalidate(*ResponseCache.ACCOUNT_ENDPOINTS)
+
+    def _generate_signature(self, timestamp: int, method: str, request_path: str, body: bytes = b"") -> str:
         """生成请求签名
-        
+
         Args:
             timestamp: 时间戳（毫秒）
             method: HTTP方法（GET/POST等）
-            path: 请求路径（例如'/api/v1/orders'）
-            body: 请求体字符串，默认为空
-            
+            request_path: 请求路径，包含查询字符串（例如'/api/v1/depth?symbol=SOL_USDC'）
+            body: 实际发送的请求体字节，默认为空
+
         Returns:
             签名字符串
         """
-        message = f"{timestamp}{method}{path}{body}"
+        message = f"{timestamp}{method}{request_path}".encode() + body
         signature = hmac.new(
             self.api_secret,
-            message.encode(),
+            message,
             hashlib.sha256
         ).hexdigest()
         return signature
-    
-    def _get_headers(self, method: str, path: str, data: str = "") -> Dict[str, str]:
-        """获取请求头
-        
-        Args:
-            method: HTTP方法（GET/POST等）
-            path: 请求路径
-            data: 请求数据字符串
-            
-        Returns:
-            包含认证信息的请求头字典
-        """
-        timestamp = int(time.time() * 1000)
-        signature = self._generate_signature(timestamp, method, path, data)
-        
-        return {
-            "X-API-KEY": self.api_key,
-            "X-TIMESTAMP": str(timestamp),
-            "X-SIGNATURE": signature,
-            "Content-Type": "application/json"
-        }
-    
-    async def _request(
-        self, 
-        method: str, 
-        endpoint: str, 
-        params: Optional[Dict] = None, 
-        data: Optional[Dict] = None
+
+    async def _make_request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict] = None,
+        data: Optional[Dict] = None,
+        priority: int = PRIORITY_ACCOUNT
     ) -> Any:
         """发送HTTP请求到Backpack API
-        
+
         Args:
             method: HTTP方法（GET/POST等）
             endpoint: API端点（例如'/api/v1/orders'）
             params: URL参数
             data: 请求体数据
-            
+            priority: 请求优先级，决定限流时的排队顺序
+
         Returns:
-            响应数据（通常为字典或列表）
+            响应数据（通常为字典或列表），失败时返回包含error字段的字典。
+            GET请求的结果可能来自缓存或与并发调用者共享，调用者不应修改返回值
+        """
+        await self.initialize()
+
+        if method != "GET":
+            return await self._dispatch_request(method, endpoint, params, data, priority)
+
+        key = (endpoint, tuple(sorted(params.items())) if params else ())
+        cacheable = self.cache.is_cacheable(endpoint)
+        if cacheable:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        # 代数参与合并键，失效之后的调用者不会加入失效之前发出的请求
+        generation = self.cache.generation(endpoint)
+        result = await self.single_flight.do(
+            key + (generation,), lambda: self._dispatch_request(method, endpoint, params, data, priority)
+        )
+        # 加入的是被丢弃的低优先级请求时，高优先级调用者自行重发
+        if isinstance(result, dict) and result.get("shed") and priority < self.scheduler.options["low_priority"]:
+            result = await self._dispatch_request(method, endpoint, params, data, priority)
+
+        if cacheable and not (isinstance(result, dict) and "error" in result):
+            self.cache.set(key, result, generation)
+        return result
+
+    async def _dispatch_request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict],
+        data: Optional[Dict],
+        priority: int
+    ) -> Any:
+        """经过熔断器和限流器发送请求，按重试策略处理失败
+
+        只有幂等请求会在超时或5xx后重试；连接未建立或被429拒绝的请求
+        没有到达交易所，任何方法都可以安全重试。
+        """
+        idempotent = method in IDEMPOTENT_METHODS
+        max_attempts = self.retry_policy.attempts_for(endpoint)
+        attempt = 0
+        clock_retried = False
+        self._maybe_resync_clock()
+
+        while True:
+            if not self.breaker.allow():
+                return {"error": "交易所连接异常，请求已熔断", "circuit_open": True}
+
+            queued_at = time.perf_counter()
+            try:
+                await self.scheduler.acquire(priority)
+                self.metrics.record_queue_wait(method, endpoint, time.perf_counter() - queued_at)
+            except RequestShed as e:
+                self.breaker.abandon()
+                self.logger.warning(f"请求被限流丢弃: {method} {endpoint} - {e}")
+                return {"error": str(e), "shed": True}
+
+            delay = None
+            resync_clock = False
+            try:
+                status, result, retry_after = await self._send_request(method, endpoint, params, data)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.breaker.record_failure()
+                self.logger.error(f"请求异常: {method} {endpoint} - {e!r}")
+                error = {"error": str(e) or type(e).__name__}
+                retryable = idempotent or isinstance(e, aiohttp.ClientConnectorError)
+            except asyncio.CancelledError:
+                self.breaker.abandon()
+                raise
+            except Exception as e:
+                self.breaker.abandon()
+                self.logger.error(f"请求异常: {method} {endpoint} - {e!r}")
+                return {"error": str(e)}
+            else:
+                if status >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+
+                if status < 400:
+                    return result
+
+                self.logger.error(f"API请求失败: {status} - {result}")
+                message = result.get("message", result) if isinstance(result, dict) else result
+                error = {"error": message, "status": status}
+                if not clock_retried and self._is_timestamp_rejection(status, result):
+                    # 时间戳被拒绝的请求没有执行，重新同步时钟后立即重发一次
+                    clock_retried = True
+                    resync_clock = True
+                    retryable = True
+                elif status == 429:
+                    # 由限流器统一退让，重试时在acquire中等待
+                    self.scheduler.pause(retry_after if retry_after is not None else self.retry_policy.backoff(attempt))
+                    delay = 0
+                    retryable = True
+                else:
+                    retryable = idempotent and self.retry_policy.is_retryable_status(status)
+            finally:
+                self.scheduler.release()
+
+            if resync_clock:
+                self.clock.invalidate()
+                await self.sync_clock()
+                self.logger.warning(f"时间戳被拒绝，已重新同步时钟后重发 {method} {endpoint}")
+                continue
+
+            attempt += 1
+            if not retryable or attempt >= max_attempts:
+                return error
+
+            if delay is None:
+                delay = self.retry_policy.backoff(attempt - 1)
+            self.retry_policy.retries += 1
+            self.logger.warning(f"重试请求 {method} {endpoint} ({attempt}/{max_attempts - 1})，等待 {delay:.2f} 秒")
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def _send_request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict],
+        data: Optional[Dict]
+    ) -> tuple:
+        """签名并发送单个HTTP请求
+
+        Returns:
+            (HTTP状态码, 响应数据, Retry-After秒数或None)
         """
-        session = await self._get_session()
         url = f"{self.base_url}{endpoint}"
-        
-        # 对于GET请求，数据通过URL参数传递
-        # 对于POST等请求，数据通过请求体传递
-        json_data = json.dumps(data) if data else ""
-        headers = self._get_headers(method, endpoint, json_data)
-        
+        timestamp = self.clock.now_ms()
+        headers = {
+            "X-API-KEY": self.api_key,
+            "X-TIMESTAMP": str(timestamp),
+            "X-WINDOW": str(self.clock.recv_window),
+            "Content-Type": "application/json"
+        }
+
+        # 查询参数同时参与URL和签名
+        if params:
+            query_string = urllib.parse.urlencode(params)
+            url = f"{url}?{query_string}"
+            request_path = f"{endpoint}?{query_string}"
+        else:
+            request_path = endpoint
+
+        # 请求体只序列化一次，签名与发送使用同一份字节
+        body = b"" if data is None else self.codec.dumps(data)
+        headers["X-SIGNATURE"] = self._generate_signature(timestamp, method, request_path, body)
+
+        started = time.perf_counter()
         try:
-            async with session.request(
-                method, 
-                url, 
-                params=params, 
-                json=data if data else None, 
-                headers=headers
+            async with self.session.request(
+                method,
+                url,
+                headers=headers,
+                data=body or None,
+                timeout=self.transport.timeout_for(endpoint)
             ) as response:
-                result = await response.json()
-                
-                # 检查API响应是否包含错误
-                if isinstance(result, dict) and "code" in result and result["code"] != 0:
-                    self.logger.error(f"API错误: {result}")
-                
-                return result
-        except Exception as e:
-            self.logger.error(f"请求失败: {e}")
+                raw = await response.read()
+                status = response.status
+                response_headers = response.headers
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.metrics.record(method, endpoint, time.perf_counter() - started, type(e).__name__, len(body))
             raise
-    
+        self.metrics.record(method, endpoint, time.perf_counter() - started, status, len(body), len(raw))
+
+        try:
+            result = self.codec.loads(raw) if raw else {}
+        except ValueError:
+            # 网关错误等场景可能返回非JSON内容
+            result = raw.decode("utf-8", errors="replace")
+            if status < 400:
+                raise
+
+        retry_after = None
+        if status == 429:
+            try:
+                retry_after = float(response_headers.get("Retry-After", ""))
+            except ValueError:
+                pass
+        return status, result, retry_after
+
     # ----------- 市场数据接口 -----------
-    
-    async def get_price(self, symbol: str) -> float:
+
+    def is_price_fresh(self, symbol: str, max_age: Optional[float] = None) -> bool:
+        """缓存中的价格是否足够新
+
+        Args:
+            symbol: 交易对名称
+            max_age: 最大年龄(秒)，默认使用price_max_age
+        """
+        return not self.prices.is_stale(symbol, self.price_max_age if max_age is None else max_age)
+
+    async def get_price(self, symbol: str, priority: int = PRIORITY_MARKET, max_age: Optional[float] = None) -> float:
         """获取单个交易对的最新价格
-        
+
+        优先使用WebSocket推送到缓存中的价格，缓存价格过旧时才通过REST查询。
+
         Args:
             symbol: 交易对名称（例如'BTC_USDC_PERP'）
-            
+            priority: 请求优先级
+            max_age: 缓存价格的最大可用年龄(秒)，默认使用price_max_age
+
         Returns:
-            最新价格
+            最新价格，失败时返回0
         """
-        try:
-            # 首先尝试从缓存中获取
-            cached_price = self.prices.get(symbol)
-            if cached_price > 0:
-                return cached_price
-            
-            # 如果缓存中没有，则通过API获取
-            result = await self._request("GET", f"/api/v1/ticker/price?symbol={symbol}")
-            if "price" in result:
-                price = float(result["price"])
-                # 更新缓存
-                self.prices.update(symbol, price)
-                return price
-            return 0
-        except Exception as e:
-            self.logger.error(f"获取价格失败: {e}")
-            return 0
-    
+        cached_price = self.prices.get(symbol, max_age=self.price_max_age if max_age is None else max_age)
+        if cached_price > 0:
+            return cached_price
+
+        result = await self._make_request("GET", "/api/v1/ticker/price", {"symbol": symbol}, priority=priority)
+        if isinstance(result, dict) and "price" in result:
+            price = float(result["price"])
+            self.prices.update(symbol, price)
+            return price
+
+        if isinstance(result, dict) and "error" in result:
+            self.logger.error(f"获取价格失败: {result['error']}")
+        return 0
+
     async def get_orderbook(self, symbol: str, limit: int = 10) -> Dict:
         """获取交易对的订单簿（深度）数据
-        
+
         Args:
             symbol: 交易对名称
             limit: 返回的价格档位数量，默认10
-            
+
         Returns:
             订单簿数据，包含bids和asks
         """
-        endpoint = f"/api/v1/depth?symbol={symbol}&limit={limit}"
-        try:
-            result = await self._request("GET", endpoint)
-            return result
-        except Exception as e:
-            self.logger.error(f"获取订单簿失败: {e}")
+        result = await self._make_request(
+            "GET", "/api/v1/depth", {"symbol": symbol, "limit": limit}, priority=PRIORITY_MARKET
+        )
+        if not isinstance(result, dict) or "error" in result:
+            self.logger.error(f"获取订单簿失败: {result}")
             return {"bids": [], "asks": []}
-    
+        return result
+
+    async def get_markets(self) -> List[Dict]:
+        """获取所有市场的交易参数
+
+        Returns:
+            市场列表，包含symbol和filters(价格精度、数量精度等)
+        """
+        result = await self._make_request("GET", "/api/v1/markets", priority=PRIORITY_MARKET)
+        self._markets_fetched_at = time.monotonic()
+        if not isinstance(result, list):
+            self.logger.error(f"获取市场信息失败: {result}")
+            return []
+        for market in result:
+            filters = market.get("filters", {})
+            tick_size = filters.get("price", {}).get("tickSize")
+            if tick_size:
+                self._tick_sizes[market["symbol"]] = float(tick_size)
+            step_size = filters.get("quantity", {}).get("stepSize")
+            if step_size:
+                self._step_sizes[market["symbol"]] = float(step_size)
+        return result
+
+    async def _load_market(self, symbol: str):
+        """交易对的市场参数未知时拉取一次，最近拉取过仍查不到时不重复请求"""
+        if symbol in self._tick_sizes:
+            return
+        fetched_at = self._markets_fetched_at
+        if fetched_at is not None and time.monotonic() - fetched_at < self.MARKETS_MISS_TTL:
+            return
+        await self.get_markets()
+
+    async def get_tick_size(self, symbol: str) -> float:
+        """获取交易对的最小价格变动单位，未知时返回0"""
+        await self._load_market(symbol)
+        return self._tick_sizes.get(symbol, 0.0)
+
+    async def get_step_size(self, symbol: str) -> float:
+        """获取交易对的最小数量变动单位，未知时返回0"""
+        await self._load_market(symbol)
+        return self._step_sizes.get(symbol, 0.0)
+
+    @staticmethod
+    def round_to_tick(price: float, tick_size: float) -> float:
+        """按给定的价格精度取整，精度未知(0)时保留6位有效数字"""
+        if tick_size <= 0:
+            return float(f"{price:.6g}")
+        decimals = max(0, -int(math.floor(math.log10(tick_size))))
+        return round(round(price / tick_size) * tick_size, decimals)
+
+    @staticmethod
+    def floor_to_step(quantity: float, step_size: float) -> float:
+        """按给定的数量精度向下取整，精度未知(0)时保留6位小数"""
+        if step_size <= 0:
+            return round(quantity, 6)
+        decimals = max(0, -int(math.floor(math.log10(step_size))))
+        # 加一个极小量，避免浮点误差把恰好整步的数量向下多取一步
+        return round(math.floor(quantity / step_size + 1e-9) * step_size, decimals)
+
+    async def round_price(self, symbol: str, price: float) -> float:
+        """按交易对的价格精度取整"""
+        return self.round_to_tick(price, await self.get_tick_size(symbol))
+
+    async def round_quantity(self, symbol: str, quantity: float) -> float:
+        """按交易对的数量精度向下取整"""
+        return self.floor_to_step(quantity, await self.get_step_size(symbol))
+
     async def get_funding_rate(self, symbol: str) -> float:
         """获取单个交易对的资金费率
-        
+
         Args:
             symbol: 交易对名称
-            
+
         Returns:
             资金费率
         """
-        try:
-            endpoint = f"/api/v1/funding/current-rate?symbol={symbol}"
-            result = await self._request("GET", endpoint)
-            if "fundingRate" in result:
-                return float(result["fundingRate"])
-            return 0
-        except Exception as e:
-            self.logger.error(f"获取资金费率失败: {e}")
-            return 0
-    
-    async def get_all_funding_rates(self) -> Dict[str, float]:
+        result = await self._make_request(
+            "GET", "/api/v1/funding/current-rate", {"symbol": symbol}, priority=PRIORITY_MARKET
+        )
+        if isinstance(result, dict) and "fundingRate" in result:
+            return float(result["fundingRate"])
+
+        self.logger.error(f"获取资金费率失败: {result}")
+        return 0
+
+    async def get_all_funding_rates(self, priority: int = PRIORITY_MARKET) -> Dict[str, float]:
         """获取所有交易对的资金费率
-        
+
+        Args:
+            priority: 请求优先级
+
         Returns:
             交易对和对应资金费率的字典
         """
-        try:
-            endpoint = "/api/v1/funding/current-rates"
-            result = await self._request("GET", endpoint)
-            
-            # 处理返回结果为字典
-            rates = {}
-            for item in result:
-                if "symbol" in item and "fundingRate" in item:
-                    rates[item["symbol"]] = float(item["fundingRate"])
-            
-            return rates
-        except Exception as e:
-            self.logger.error(f"获取所有资金费率失败: {e}")
+        result = await self._make_request("GET", "/api/v1/funding/current-rates", priority=priority)
+        if not isinstance(result, list):
+            self.logger.error(f"获取所有资金费率失败: {result}")
             return {}
-    
+
+        rates = {}
+        for item in result:
+            if "symbol" in item and "fundingRate" in item:
+                rates[item["symbol"]] = float(item["fundingRate"])
+
+        return rates
+
     # ----------- 订单接口 -----------
-    
+
+    def _build_order(
+        self,
+        symbol: str,
+        side: str,
+        quantity: float,
+        order_type: str = "MARKET",
+        price: Optional[float] = None,
+        post_only: bool = False,
+        reduce_only: bool = False,
+        trigger_price: Optional[float] = None,
+        client_id: Optional[str] = None
+    ) -> Optional[Dict]:
+        """生成下单请求体，参数无效时返回None"""
+        if not symbol or not side or quantity <= 0:
+            self.logger.error(f"下单参数无效: symbol={symbol}, side={side}, quantity={quantity}")
+            return None
+
+        data = {
+            "symbol": symbol,
+            "side": side,
+            "type": order_type,
+            "quantity": str(quantity),  # API要求数量为字符串
+            "clientId": client_id or str(uuid.uuid4())
+        }
+
+        if order_type == "LIMIT" and price is not None:
+            data["price"] = str(price)
+
+        if post_only:
+            data["postOnly"] = True
+
+        if reduce_only:
+            data["reduceOnly"] = True
+
+        if trigger_price is not None:
+            data["triggerPrice"] = str(trigger_price)
+            data["triggerQuantity"] = str(quantity)
+
+        return data
+
     async def place_order(
-        self, 
-        symbol: str, 
-        side: str, 
+        self,
+        symbol: str,
+        side: str,
         quantity: float,
         order_type: str = "MARKET",
         price: Optional[float] = None,
         post_only: bool = False,
-        reduce_only: bool = False
+        reduce_only: bool = False,
+        trigger_price: Optional[float] = None
     ) -> Dict:
         """下单
-        
+
         Args:
             symbol: 交易对名称
             side: 交易方向，'BUY'或'SELL'
@@ -283,74 +2240,192 @@ class BackpackAPI:
             price: 价格，LIMIT单必须指定
             post_only: 是否只做Maker
             reduce_only: 是否只减仓
-            
+            trigger_price: 触发价格，指定后成为条件单，价格到达后由交易所提交
+
         Returns:
             下单结果
         """
-        data = {
-            "symbol": symbol,
-            "side": side,
-            "type": order_type,
-            "quantity": str(quantity)  # API要求数量为字符串
-        }
-        
-        if order_type == "LIMIT" and price is not None:
-            data["price"] = str(price)
-        
-        if post_only:
-            data["postOnly"] = True
-        
-        if reduce_only:
-            data["reduceOnly"] = True
-        
-        try:
-            result = await self._request("POST", "/api/v1/order", data=data)
-            return result
-        except Exception as e:
-            self.logger.error(f"下单失败: {e}")
-            return {"error": str(e)}
-    
+        data = self._build_order(symbol, side, quantity, order_type, price, post_only, reduce_only, trigger_price)
+        if data is None:
+            return {"error": "参数无效"}
+
+        self.logger.info(f"发送订单: {data}")
+        result = await self._make_request("POST", "/api/v1/order", data=data, priority=PRIORITY_ORDER)
+        self.invalidate_account_cache()
+
+        if "error" in result:
+            self.logger.error(f"下单失败: {result['error']}")
+        else:
+            self.logger.info(f"订单已提交: {result}")
+
+        return result
+
+    async def place_orders(self, orders: List[Dict], chunk_size: Optional[int] = None) -> Dict[str, Dict]:
+        """批量下单
+
+        订单按chunk_size分组，每组一个请求，各组并发发送。
+
+        Args:
+            orders: 订单列表，每项的键与place_order参数相同，可额外指定client_id
+            chunk_size: 每个请求的订单数，默认MAX_BATCH_ORDERS
+
+        Returns:
+            clientId到下单结果的映射，失败的订单结果包含error字段
+        """
+        chunk_size = max(1, min(chunk_size or self.MAX_BATCH_ORDERS, self.MAX_BATCH_ORDERS))
+        results = {}
+        payloads = []
+        for order in orders:
+            client_id = order.get("client_id") or str(uuid.uuid4())
+            data = self._build_order(**dict(order, client_id=client_id))
+            if data is None:
+                results[client_id] = {"error": "参数无效", "clientId": client_id}
+            else:
+                payloads.append(data)
+        if not payloads:
+            return results
+
+        chunks = [payloads[i:i + chunk_size] for i in range(0, len(payloads), chunk_size)]
+        self.logger.info(f"批量下单: {len(payloads)} 个订单，{len(chunks)} 个请求")
+        responses = await asyncio.gather(*(
+            self._make_request("POST", "/api/v1/orders", data=chunk, priority=PRIORITY_ORDER) for chunk in chunks
+        ))
+        self.invalidate_account_cache()
+
+        for chunk, response in zip(chunks, responses):
+            if not isinstance(response, list):
+                # 整组失败
+                self.logger.error(f"批量下单失败: {response}")
+                for data in chunk:
+                    results[data["clientId"]] = dict(response, clientId=data["clientId"])
+                continue
+            # 返回列表与请求顺序一致，优先按返回中的clientId对应
+            for data, item in zip(chunk, response):
+                client_id = str(item.get("clientId", data["clientId"])) if isinstance(item, dict) else data["clientId"]
+                results[client_id] = item if isinstance(item, dict) else {"error": str(item)}
+            for data in chunk[len(response):]:
+                results[data["clientId"]] = {"error": "批量下单未返回结果", "clientId": data["clientId"]}
+
+        failed = sum(1 for result in results.values() if "error" in result)
+        if failed:
+            self.logger.error(f"批量下单: {failed}/{len(orders)} 个订单失败")
+        return results
+
+    async def cancel_orders(self, symbol: str, order_ids: Iterable[str]) -> Dict[str, Dict]:
+        """并发取消多个订单
+
+        Args:
+            symbol: 交易对名称
+            order_ids: 订单ID列表
+
+        Returns:
+            订单ID到取消结果的映射
+        """
+        order_ids = list(order_ids)
+        responses = await asyncio.gather(*(self.cancel_order(symbol, order_id) for order_id in order_ids))
+        return dict(zip(order_ids, responses))
+
+    async def cancel_replace(
+        self,
+        symbol: str,
+        replacements: List[Tuple[Optional[str], Dict]],
+        replace_all: bool = False
+    ) -> Dict[str, Dict]:
+        """撤单并改挂
+
+        先撤掉旧订单，再把撤单成功(或旧订单已不存在)的新订单合并成批量请求，
+        避免旧单未撤掉时新单同时挂出。
+
+        逐单撤销每单一个请求，虽然并发发送且按下单优先级排队，仍受限流器的并发数和令牌约束，
+        数十个订单会分成几批发出。替换交易对上的全部挂单时应指定replace_all，
+        用一个撤销全部的请求代替逐单撤销，整个改挂只需两次往返。
+
+        Args:
+            symbol: 交易对名称
+            replacements: (旧订单ID, 新订单参数)列表，旧订单ID为None表示直接下新单
+            replace_all: 旧订单是该交易对上的全部挂单，用撤销全部代替逐单撤销
+
+        Returns:
+            clientId到新订单下单结果的映射，旧订单撤销失败的条目包含error字段；
+            replace_all时撤销全部失败，所有新订单都不下单并返回错误
+        """
+        replacements = [
+            (old_id, dict(order, symbol=symbol, client_id=order.get("client_id") or str(uuid.uuid4())))
+            for old_id, order in replacements
+        ]
+        old_ids = [old_id for old_id, _ in replacements if old_id]
+        cancelled = {}
+        if replace_all:
+            result = await self.cancel_all_orders(symbol)
+            if isinstance(result, dict) and "error" in result:
+                # 旧挂单状态未知，新订单一律不下，避免与未撤掉的旧单同时挂出
+                return {
+                    order["client_id"]: {"error": f"撤销全部挂单失败: {result['error']}", "clientId": order["client_id"]}
+                    for _, order in replacements
+                }
+        elif old_ids:
+            cancelled = await self.cancel_orders(symbol, old_ids)
+
+        results = {}
+        orders = []
+        for old_id, order in replacements:
+            cancel_result = cancelled.get(old_id) if old_id else None
+            if cancel_result is not None and "error" in cancel_result and cancel_result.get("status") != 404:
+                results[order["client_id"]] = {"error": f"撤销旧订单失败: {cancel_result['error']}", "clientId": order["client_id"]}
+                continue
+            orders.append(order)
+
+        results.update(await self.place_orders(orders))
+        return results
+
     async def place_order_with_depth(
-        self, 
-        symbol: str, 
-        side: str, 
+        self,
+        symbol: str,
+        side: str,
         quantity: float,
         order_type: str = "LIMIT",
         depth_tolerance: float = 0.001
     ) -> Dict:
         """使用订单簿深度数据下单，以获得更好的成交价格
-        
+
         Args:
             symbol: 交易对名称
             side: 交易方向，'BUY'或'SELL'
             quantity: 交易数量
             order_type: 订单类型，默认为'LIMIT'
             depth_tolerance: 价格容忍度
-            
+
         Returns:
             下单结果
         """
-        # 获取深度数据
-        orderbook = await self.get_orderbook(symbol)
-        
-        if not orderbook["bids"] or not orderbook["asks"]:
-            self.logger.warning(f"订单簿为空，使用市价单")
-            return await self.place_order(symbol, side, quantity, "MARKET")
-        
-        # 根据交易方向确定参考价格
+        # 优先使用本地订单簿，未同步或过旧时回退到REST深度快照
+        book = self.get_local_orderbook(symbol)
+        if book is None:
+            snapshot = await self.get_orderbook(symbol)
+            if not snapshot.get("bids") or not snapshot.get("asks"):
+                self.logger.warning(f"订单簿为空，使用市价单")
+                return await self.place_order(symbol, side, quantity, "MARKET")
+            book = OrderBook(symbol)
+            book.apply_snapshot(snapshot)
+
+        # 根据交易方向确定参考价格：能够吃满下单数量的最差价格，深度不足时使用最优价
+        reference_price = book.sweep_price(side, quantity)
+        if reference_price is None:
+            top = book.best_ask() if side == "BUY" else book.best_bid()
+            if top is None:
+                self.logger.warning(f"订单簿为空，使用市价单")
+                return await self.place_order(symbol, side, quantity, "MARKET")
+            reference_price = top[0]
+
         if side == "BUY":
-            # 买入使用卖单价格作为参考
-            reference_price = float(orderbook["asks"][0][0])
-            # 添加价格容忍度，价格略高于卖一价
+            # 添加价格容忍度，价格略高于参考卖价
             price = reference_price * (1 + depth_tolerance)
         else:
-            # 卖出使用买单价格作为参考
-            reference_price = float(orderbook["bids"][0][0])
-            # 添加价格容忍度，价格略低于买一价
+            # 添加价格容忍度，价格略低于参考买价
             price = reference_price * (1 - depth_tolerance)
-        
+
         self.logger.info(f"深度下单 - 参考价: {reference_price}, 下单价: {price}")
-        
+
         # 下限价单
         return await self.place_order(
             symbol=symbol,
@@ -359,14 +2434,14 @@ class BackpackAPI:
             order_type="LIMIT",
             price=price
         )
-    
+
     async def cancel_order(self, symbol: str, order_id: str) -> Dict:
         """取消订单
-        
+
         Args:
             symbol: 交易对名称
             order_id: 订单ID
-            
+
         Returns:
             取消结果
         """
@@ -374,41 +2449,49 @@ class BackpackAPI:
             "symbol": symbol,
             "orderId": order_id
         }
-        
-        try:
-            result = await self._request("DELETE", "/api/v1/order", data=data)
-            return result
-        except Exception as e:
-            self.logger.error(f"取消订单失败: {e}")
-            return {"error": str(e)}
-    
-    async def cancel_all_orders(self, symbol: Optional[str] = None) -> Dict:
+
+        self.logger.info(f"取消订单: {data}")
+        result = await self._make_request("DELETE", "/api/v1/order", data=data, priority=PRIORITY_ORDER)
+        self.invalidate_account_cache()
+
+        if "error" in result:
+            self.logger.error(f"取消订单失败: {result['error']}")
+        else:
+            self.logger.info(f"订单已取消: {result}")
+
+        return result
+
+    async def cancel_all_orders(self, symbol: Optional[str] = None) -> Union[Dict, List]:
         """取消所有订单或特定交易对的所有订单
-        
+
         Args:
             symbol: 交易对名称，可选
-            
+
         Returns:
             取消结果
         """
         data = {}
         if symbol:
             data["symbol"] = symbol
-        
-        try:
-            result = await self._request("DELETE", "/api/v1/orders", data=data)
-            return result
-        except Exception as e:
-            self.logger.error(f"取消所有订单失败: {e}")
-            return {"error": str(e)}
-    
+
+        self.logger.info(f"取消所有订单: {symbol or '所有交易对'}")
+        result = await self._make_request("DELETE", "/api/v1/orders", data=data, priority=PRIORITY_ORDER)
+        self.invalidate_account_cache()
+
+        if isinstance(result, dict) and "error" in result:
+            self.logger.error(f"取消所有订单失败: {result['error']}")
+        else:
+            self.logger.info(f"所有订单已取消: {result}")
+
+        return result
+
     async def get_order_status(self, symbol: str, order_id: str) -> Dict:
         """查询订单状态
-        
+
         Args:
             symbol: 交易对名称
             order_id: 订单ID
-            
+
         Returns:
             订单状态
         """
@@ -416,163 +2499,531 @@ class BackpackAPI:
             "symbol": symbol,
             "orderId": order_id
         }
-        
-        try:
-            result = await self._request("GET", "/api/v1/order", params=params)
-            return result
-        except Exception as e:
-            self.logger.error(f"查询订单状态失败: {e}")
-            return {"error": str(e)}
-    
+
+        result = await self._make_request("GET", "/api/v1/order", params=params)
+        if "error" in result:
+            self.logger.error(f"查询订单状态失败: {result['error']}")
+        return result
+
+    async def lookup_order_status(self, symbol: str, order_id: str, query: bool = True) -> Optional[str]:
+        """订单状态，优先使用账户推送记录的最新状态，没有记录时通过REST查询
+
+        Args:
+            symbol: 交易对名称
+            order_id: 订单ID
+            query: 推送中没有记录时是否发送REST请求
+
+        Returns:
+            订单状态，未知或查询失败时返回None
+        """
+        event = self.order_events.get(order_id)
+        if event is not None:
+            return event.get("status")
+        if not query:
+            return None
+        result = await self.get_order_status(symbol, order_id)
+        return result.get("status") if isinstance(result, dict) else None
+
     async def get_open_orders(self, symbol: Optional[str] = None) -> List[Dict]:
         """查询未成交订单
-        
+
         Args:
             symbol: 交易对名称，可选
-            
+
         Returns:
             未成交订单列表
         """
         params = {}
         if symbol:
             params["symbol"] = symbol
-        
-        try:
-            result = await self._request("GET", "/api/v1/open-orders", params=params)
-            return result
-        except Exception as e:
-            self.logger.error(f"查询未成交订单失败: {e}")
+
+        result = await self._make_request("GET", "/api/v1/open-orders", params=params)
+        if not isinstance(result, list):
+            self.logger.error(f"查询未成交订单失败: {result}")
             return []
-    
+        return result
+
     # ----------- 账户接口 -----------
-    
+
     async def get_account_info(self) -> Dict:
         """获取账户信息
-        
+
         Returns:
             账户信息
         """
-        try:
-            result = await self._request("GET", "/api/v1/account")
-            return result
-        except Exception as e:
-            self.logger.error(f"获取账户信息失败: {e}")
-            return {"error": str(e)}
-    
-    async def get_balances(self) -> List[Dict]:
+        result = await self._make_request("GET", "/api/v1/account")
+        if "error" in result:
+            self.logger.error(f"获取账户信息失败: {result['error']}")
+        return result
+
+    async def get_balances(self, priority: int = PRIORITY_ACCOUNT, raise_on_error: bool = False) -> List[Dict]:
         """获取账户余额
-        
+
+        Args:
+            priority: 请求优先级，决定是否下单的读取应使用PRIORITY_ORDER，避免被限流丢弃
+            raise_on_error: 读取失败时抛出AccountReadError，而不是返回空列表
+
         Returns:
-            余额信息列表
+            余额信息列表，每项包含asset、available、locked和total
         """
-        try:
-            result = await self._request("GET", "/api/v1/balance")
+        result = await self._make_request("GET", "/api/v1/capital", priority=priority)
+        if isinstance(result, list):
             return result
-        except Exception as e:
-            self.logger.error(f"获取余额失败: {e}")
+        if not isinstance(result, dict) or "error" in result:
+            self.logger.error(f"获取余额失败: {result}")
+            if raise_on_error:
+                raise AccountReadError(f"获取余额失败: {result}")
             return []
-    
-    async def get_positions(self) -> List[Dict]:
+
+        # /api/v1/capital 以资产名为键返回，统一转换为列表
+        balances = []
+        for asset, info in result.items():
+            available = float(info.get("available", 0))
+            locked = float(info.get("locked", 0))
+            staked = float(info.get("staked", 0))
+            balances.append({
+                "asset": asset,
+                "available": available,
+                "locked": locked,
+                "staked": staked,
+                "total": available + locked + staked
+            })
+        return balances
+
+    async def get_positions(self, priority: int = PRIORITY_ACCOUNT, raise_on_error: bool = False) -> List[Dict]:
         """获取持仓信息
-        
+
+        Args:
+            priority: 请求优先级，决定是否下单的读取应使用PRIORITY_ORDER，避免被限流丢弃
+            raise_on_error: 读取失败时抛出AccountReadError，而不是返回空列表
+
         Returns:
             持仓信息列表
         """
-        try:
-            result = await self._request("GET", "/api/v1/positions")
-            return result
-        except Exception as e:
-            self.logger.error(f"获取持仓信息失败: {e}")
+        result = await self._make_request("GET", "/api/v1/positions", priority=priority)
+        if not isinstance(result, list):
+            self.logger.error(f"获取持仓信息失败: {result}")
+            if raise_on_error:
+                raise AccountReadError(f"获取持仓信息失败: {result}")
             return []
-    
-    async def get_position(self, symbol: str) -> Optional[Dict]:
+        return result
+
+    async def get_position(self, symbol: str, priority: int = PRIORITY_ACCOUNT, use_stream: bool = True) -> Optional[Dict]:
         """获取单个交易对的持仓信息
-        
+
+        账户推送在线且已与REST对账时直接返回推送维护的持仓，不发送请求。
+
         Args:
             symbol: 交易对名称
-            
+            priority: 请求优先级
+            use_stream: 是否允许使用推送维护的持仓
+
         Returns:
-            持仓信息或None
+            持仓信息，没有持仓时返回None
+
+        Raises:
+            AccountReadError: 持仓读取失败，此时无法判断是否空仓
         """
-        try:
-            positions = await self.get_positions()
-            for position in positions:
-                if position["symbol"] == symbol:
-                    return position
-            return None
-        except Exception as e:
-            self.logger.error(f"获取单个持仓信息失败: {e}")
-            return None
-    
+        if use_stream and self.is_account_stream_live():
+            position = self.stream_positions.get(symbol)
+            if position is None or float(position.get("quantity", 0)) == 0:
+                return None
+            return position
+
+        positions = await self.get_positions(priority, raise_on_error=True)
+        for position in positions:
+            if position.get("symbol") == symbol and float(position.get("quantity", 0)) != 0:
+                return position
+        return None
+
     # ----------- WebSocket接口 -----------
-    
-    def register_price_callback(self, callback: Callable[[str, float], None]):
+
+    def is_price_stream_live(self) -> bool:
+        """WebSocket价格流是否在线"""
+        return self.ws_connection is not None
+
+    def is_account_stream_live(self) -> bool:
+        """账户推送是否在线，且持仓已与REST对账"""
+        return (
+            self.ws_connection is not None
+            and self.positions_synced
+            and self.ACCOUNT_STREAMS[0] in self.subscriptions.streams
+        )
+
+    def register_price_callback(self, callback: Callable[[str, float], Any]):
         """注册价格更新回调函数
-        
+
+        回调在独立任务中执行，处理较慢时只会收到每个交易对的最新价格。
+
         Args:
-            callback: 回调函数，接收交易对名称和价格
+            callback: 回调函数(可为协程函数)，接收交易对名称和价格
         """
-        self.price_callbacks.append(callback)
-    
-    async def _handle_price_update(self, symbol: str, price: float):
+        self.price_dispatcher.add(callback)
+
+    async def _handle_price_update(self, symbol: str, price: float, volume: float = 0.0):
         """处理价格更新
-        
+
         Args:
             symbol: 交易对名称
             price: 最新价格
+            volume: 成交量
+        """
+        # 更新价格缓存和K线，推送的成交量为24小时累计量
+        now = time.time()
+        self.prices.update(symbol, price, now, volume)
+        self.candles.on_tick(symbol, now, price, volume, cumulative=True)
+
+        # 投递给回调，不在接收循环中等待回调执行
+        self.price_dispatcher.publish(symbol, price)
+
+    async def _on_ticker(self, symbol: str, data: Dict):
+        """处理ticker频道推送"""
+        if "c" in data:  # c: 最新成交价, v: 24小时成交量
+            await self._handle_price_update(symbol, float(data["c"]), float(data.get("v", 0)))
+
+    async def _on_account(self, symbol: str, data: Dict):
+        """处理账户频道推送，按事件类型区分订单与持仓"""
+        event = data.get("e", "")
+        if event.startswith("order"):
+            self._on_order_update(data)
+        elif event.startswith("position"):
+            self._on_position_update(symbol, event, data)
+        # 成交和持仓变化后账户类缓存失效
+        self.invalidate_account_cache()
+
+        for callback in self.account_callbacks:
+            try:
+                callback(event, symbol)
+            except Exception as e:
+                self.logger.error(f"调用账户回调失败: {e}")
+
+    def register_account_callback(self, callback: Callable[[str, str], None]):
+        """注册账户推送回调
+
+        回调在接收循环中同步调用，只应做唤醒等待者之类的轻量操作。
+
+        Args:
+            callback: 普通函数，接收事件类型(如orderFill、positionClosed)和交易对名称
+        """
+        self.account_callbacks.append(callback)
+
+    def _on_order_update(self, data: Dict):
+        """记录订单推送，订单终结时唤醒等待者"""
+        order_id = str(data.get("i", ""))
+        if not order_id:
+            return
+        order = {
+            "orderId": order_id,
+            "clientId": data.get("c"),
+            "symbol": data.get("s"),
+            "side": data.get("S"),
+            "status": data.get("X"),
+            "executedQuantity": data.get("z", "0"),
+            "executedQuoteQuantity": data.get("Z", "0"),
+            "event": data.get("e"),
+            "updatedAt": time.time()
+        }
+        self.order_events[order_id] = order
+        self.order_events.move_to_end(order_id)
+        while len(self.order_events) > self.max_order_events:
+            self.order_events.popitem(last=False)
+
+        if order["status"] in self.ORDER_FINAL_STATUSES:
+            for waiter in self._order_waiters.pop(order_id, []):
+                if not waiter.done():
+                    waiter.set_result(order)
+
+    def _on_position_update(self, symbol: str, event: str, data: Dict):
+        """按推送更新持仓，字段与REST持仓保持一致"""
+        quantity = "0" if event == "positionClosed" else data.get("q", "0")
+        self.stream_positions[symbol] = {
+            "symbol": symbol,
+            "quantity": quantity,
+            "entryPrice": data.get("B", "0"),
+            "markPrice": data.get("M", "0"),
+            "pnlUnrealized": data.get("P", "0"),
+            "updatedAt": time.time()
+        }
+
+    def _ws_signature(self) -> List[str]:
+        """生成私有频道订阅所需的签名参数"""
+        timestamp = self.clock.now_ms()
+        window = self.clock.recv_window
+        message = f"instruction=subscribe&timestamp={timestamp}&window={window}".encode()
+        signature = hmac.new(self.api_secret, message, hashlib.sha256).hexdigest()
+        return [self.api_key, signature, str(timestamp), str(window)]
+
+    async def sync_positions(self) -> bool:
+        """通过REST拉取持仓作为推送的基准，用于订阅后和定期对账
+
+        Returns:
+            是否同步成功
         """
-        # 更新价格缓存
-        self.prices.update(symbol, price)
-        
-        # 调用所有回调函数
-        for callback in self.price_callbacks:
+        # 对账必须读取最新数据，跳过读缓存
+        self.invalidate_account_cache()
+        result = await self._make_request("GET", "/api/v1/positions", priority=PRIORITY_ACCOUNT)
+        if not isinstance(result, list):
+            self.logger.error(f"持仓对账失败: {result}")
+            return False
+        self.stream_positions = {position["symbol"]: position for position in result}
+        self.positions_synced = True
+        return True
+
+    def _schedule_position_sync(self):
+        """在后台与REST持仓对账"""
+        if self._position_sync_task is None or self._position_sync_task.done():
+            self._position_sync_task = asyncio.create_task(self.sync_positions())
+
+    async def start_account_stream(self):
+        """订阅订单与持仓推送，需先启动价格数据流"""
+        await self.subscriptions.subscribe(*self.ACCOUNT_STREAMS)
+        if self.ws_connection is not None:
+            self._schedule_position_sync()
+        self.logger.info("账户推送已订阅")
+
+    async def wait_for_order(self, order_id: str, timeout: float = 10.0) -> Optional[Dict]:
+        """等待订单到达终结状态(成交、撤销或过期)
+
+        Args:
+            order_id: 订单ID
+            timeout: 最长等待时间(秒)
+
+        Returns:
+            订单最终状态，账户推送不可用或超时返回None
+        """
+        order_id = str(order_id)
+        order = self.order_events.get(order_id)
+        if order is not None and order["status"] in self.ORDER_FINAL_STATUSES:
+            return order
+        if not self.is_account_stream_live():
+            return None
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._order_waiters.setdefault(order_id, []).append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"等待订单 {order_id} 成交超时")
+            return None
+        finally:
+            waiters = self._order_waiters.get(order_id)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._order_waiters[order_id]
+
+    async def _on_depth(self, symbol: str, data: Dict):
+        """处理depth频道的增量推送"""
+        book = self.orderbooks.get(symbol)
+        if book is None:
+            return
+        applied = book.apply_diff(int(data["U"]), int(data["u"]), data.get("b", []), data.get("a", []))
+        if not applied:
+            self.logger.warning(f"{symbol} 订单簿序号缺口，重新同步")
+            self._schedule_orderbook_resync(symbol)
+
+    def _schedule_orderbook_resync(self, symbol: str):
+        """在后台重新拉取订单簿快照"""
+        task = self._orderbook_tasks.get(symbol)
+        if task is None or task.done():
+            self._orderbook_tasks[symbol] = asyncio.create_task(self._resync_orderbook(symbol))
+
+    async def _resync_orderbook(self, symbol: str):
+        """拉取深度快照并与缓存的增量合并"""
+        book = self.orderbooks.get(symbol)
+        if book is None:
+            return
+        book.reset()
+        for attempt in range(5):
+            snapshot = await self.get_orderbook(symbol, self.orderbook_depth)
+            if "lastUpdateId" not in snapshot:
+                self.logger.error(f"{symbol} 订单簿快照无效")
+            else:
+                book.apply_snapshot(snapshot)
+                if book.synced:
+                    self.logger.info(f"{symbol} 本地订单簿已同步，更新ID: {book.last_update_id}")
+                    return
+            # 快照落后于推送或请求失败，稍后重试
+            await asyncio.sleep(min(2 ** attempt * 0.5, 5))
+        self.logger.error(f"{symbol} 本地订单簿同步失败，下单将使用REST深度")
+
+    async def start_orderbook(self, symbol: str):
+        """开始维护交易对的本地订单簿
+
+        Args:
+            symbol: 交易对名称
+        """
+        if symbol not in self.orderbooks:
+            self.orderbooks[symbol] = OrderBook(symbol)
+        await self.subscribe_symbols([symbol], channels=("depth",))
+        if self.ws_connection is not None:
+            self._schedule_orderbook_resync(symbol)
+
+    async def stop_orderbook(self, symbol: str):
+        """停止维护交易对的本地订单簿"""
+        await self.unsubscribe_symbols([symbol], channels=("depth",))
+        self.orderbooks.pop(symbol, None)
+        task = self._orderbook_tasks.pop(symbol, None)
+        if task and not task.done():
+            task.cancel()
+
+    def get_local_orderbook(self, symbol: str, max_age: Optional[float] = None) -> Optional[OrderBook]:
+        """获取已同步且足够新的本地订单簿
+
+        Args:
+            symbol: 交易对名称
+            max_age: 最大年龄(秒)，默认使用price_max_age
+
+        Returns:
+            订单簿，未维护、未同步或过旧时返回None
+        """
+        book = self.orderbooks.get(symbol)
+        if book is None or not book.synced:
+            return None
+        if book.age() > (self.price_max_age if max_age is None else max_age):
+            return None
+        return book
+
+    async def _dispatch_stream_message(self, message: Dict):
+        """按频道分发一条推送消息"""
+        item = FrameDecoder.parse_message(message)
+        if item is not None:
+            await self._dispatch_parsed(*item)
+
+    async def _dispatch_parsed(self, stream: str, channel: str, symbol: str, payload: Any):
+        """分发一条已解析的推送"""
+        # 取消订阅生效前仍可能收到少量旧频道消息，直接丢弃
+        if stream not in self.subscriptions.streams:
+            return
+        if channel == "ticker" and isinstance(payload, tuple):
+            await self._handle_price_update(symbol, *payload)
+            return
+        handler = self._stream_handlers.get(channel)
+        if handler is not None:
+            await handler(symbol, payload)
+
+    async def _dispatch_frame(self, frame: Union[str, bytes]):
+        """在事件循环中解码并分发一条原始消息，单条消息出错只记录日志，不影响连接"""
+        try:
+            item = self.decoder.parse(frame)
+        except Exception as e:
+            self.decoder.errors += 1
+            self.logger.error(f"解码WebSocket消息失败: {e}")
+            return
+        self.decoder.decoded += 1
+        if item is None:
+            return
+        try:
+            await self._dispatch_parsed(*item)
+        except Exception as e:
+            self.logger.error(f"处理推送消息失败: {e}")
+
+    async def _consume_decoded(self):
+        """按顺序分发解码线程的结果"""
+        while True:
+            item = await self.decoder.get()
             try:
-                await callback(symbol, price)
+                await self._dispatch_parsed(*item)
             except Exception as e:
-                self.logger.error(f"调用价格回调失败: {e}")
-    
+                self.logger.error(f"处理推送消息失败: {e}")
+
+    async def _refill_prices(self):
+        """重连后立即通过REST补齐已订阅交易对的价格，弥补断线期间错过的推送"""
+        symbols = self.subscriptions.symbols("ticker")
+        if not symbols:
+            return
+        await asyncio.gather(*(self.get_price(symbol, max_age=0) for symbol in symbols))
+        self.logger.info(f"已通过REST补齐价格: {symbols}")
+
     async def _ws_price_listener(self):
-        """WebSocket价格监听器"""
+        """WebSocket行情监听器，只接收已订阅频道的推送
+
+        心跳无响应或长时间无消息时视为半开连接并重连，重连按带抖动的指数退避等待。
+        """
         self.logger.info("启动WebSocket价格监听器...")
-        
+        options = self.stream_health.options
+
         while True:
             try:
-                # 连接WebSocket
-                async with websockets.connect(f"{self.ws_url}/stream") as websocket:
+                # 连接WebSocket，由websockets负责心跳，超时未收到pong时关闭连接
+                async with websockets.connect(
+                    self.ws_url,
+                    ping_interval=options["ping_interval"],
+                    ping_timeout=options["ping_timeout"]
+                ) as websocket:
                     self.ws_connection = websocket
-                    
-                    # 发送订阅请求
-                    subscribe_msg = {
-                        "method": "SUBSCRIBE",
-                        "params": ["!ticker@arr"],
-                        "id": int(time.time() * 1000)
-                    }
-                    await websocket.send(json.dumps(subscribe_msg))
-                    
+                    self.stream_health.on_connected()
+                    await self.subscriptions.attach(websocket)
+                    # 断线期间的价格推送已丢失，立即用REST补齐
+                    if self._refill_task is None or self._refill_task.done():
+                        self._refill_task = asyncio.create_task(self._refill_prices())
+                    # 断线期间的增量已丢失，所有本地订单簿重新同步
+                    for symbol in self.orderbooks:
+                        self._schedule_orderbook_resync(symbol)
+                    # 断线期间的账户变化同样丢失，重新与REST对账
+                    if self.ACCOUNT_STREAMS[0] in self.subscriptions.streams:
+                        self._schedule_position_sync()
+
                     # 处理返回数据
                     while True:
-                        response = await websocket.recv()
-                        data = json.loads(response)
-                        
-                        # 处理价格更新
-                        if "data" in data and isinstance(data["data"], list):
-                            for ticker in data["data"]:
-                                if "s" in ticker and "c" in ticker:  # s: symbol, c: close price
-                                    symbol = ticker["s"]
-                                    price = float(ticker["c"])
-                                    await self._handle_price_update(symbol, price)
-            
+                        try:
+                            response = await asyncio.wait_for(websocket.recv(), options["idle_timeout"])
+                        except asyncio.TimeoutError:
+                            raise ConnectionError(f"{options['idle_timeout']}秒未收到任何消息")
+                        if self.decode_in_thread:
+                            self.decoder.submit(response)
+                            continue
+                        await self._dispatch_frame(response)
+
+            except asyncio.CancelledError:
+                self.subscriptions.detach()
+                self.ws_connection = None
+                self.positions_synced = False
+                raise
             except Exception as e:
-                self.logger.error(f"WebSocket连接错误: {e}")
+                self.subscriptions.detach()
                 self.ws_connection = None
-                
-                # 如果连接断开，等待5秒后重连
-                await asyncio.sleep(5)
-    
-    async def start_ws_price_stream(self):
-        """启动价格数据流"""
+                self.positions_synced = False
+
+                delay = self.stream_health.on_disconnected()
+                self.logger.error(f"WebSocket连接错误: {e!r}，{delay:.1f}秒后重连")
+                await asyncio.sleep(delay)
+
+    async def subscribe_symbols(self, symbols: Iterable[str], channels: Iterable[str] = ("ticker",)):
+        """订阅交易对的行情频道，连接在线时立即生效
+
+        Args:
+            symbols: 交易对列表
+            channels: 频道列表，默认只订阅ticker
+        """
+        streams = [SubscriptionManager.stream_name(channel, symbol) for symbol in symbols for channel in channels]
+        await self.subscriptions.subscribe(*streams)
+
+    async def unsubscribe_symbols(self, symbols: Iterable[str], channels: Iterable[str] = ("ticker",)):
+        """取消订阅交易对的行情频道
+
+        Args:
+            symbols: 交易对列表
+            channels: 频道列表，默认只取消ticker
+        """
+        streams = [SubscriptionManager.stream_name(channel, symbol) for symbol in symbols for channel in channels]
+        await self.subscriptions.unsubscribe(*streams)
+
+    async def start_ws_price_stream(self, symbols: Optional[Iterable[str]] = None):
+        """启动价格数据流
+
+        Args:
+            symbols: 需要订阅价格的交易对，可在运行中通过subscribe_symbols追加
+        """
+        if symbols:
+            await self.subscribe_symbols(symbols)
+
+        if self.decode_in_thread and (self._decoded_task is None or self._decoded_task.done()):
+            self.decoder.start()
+            self._decoded_task = asyncio.create_task(self._consume_decoded())
+
         if self.ws_task is None or self.ws_task.done():
             self.ws_task = asyncio.create_task(self._ws_price_listener())
             self.logger.info("价格数据流已启动")
         else:
-            self.logger.info("价格数据流已在运行中") 
\ No newline at end of file
+            self.logger.info("价格数据流已在运行中")
@@ -9,17 +9,19 @@ import time
 import signal
 import sys
 import requests
-from typing import Dict, List, Optional, Tuple, Any
-import hmac
-import hashlib
+from typing import Dict, List, Optional, Tuple, Any, Callable
 import base64
-import urllib.parse
-import uuid
 import datetime
 import aiohttp
 import re
 import subprocess
 import traceback
+import array
+import bisect
+import heapq
+import uuid
+
+from backpack_api_impl import BackpackAPI, AccountReadError, RetryPolicy, PRIORITY_BACKGROUND, PRIORITY_ORDER
 
 # 设置日志记录
 logging.basicConfig(
@@ -35,6 +37,9 @@ logger = logging.getLogger("BackpackBot")
 # 配置文件路径
 CONFIG_FILE = "config.json"
 
+# 止盈止损判断允许使用的最旧价格(秒)，超过后必须重新查询
+MAX_STOP_PRICE_AGE = 5
+
 # 默认配置
 DEFAULT_CONFIG = {
     "telegram": {
@@ -47,229 +52,105 @@ DEFAULT_CONFIG = {
         "base_url": "https://api.backpack.exchange",
         "ws_url": "wss://ws.backpack.exchange"
     },
+    "network": {
+        "pool_size": 20,
+        "pool_size_per_host": 10,
+        "keepalive_timeout": 60,
+        "dns_cache_ttl": 300,
+        "connect_timeout": 3,
+        "default_timeout": 10,
+        "warmup_connections": 2,
+        "endpoint_timeouts": {
+            "/api/v1/order": 5,
+            "/api/v1/orders": 5,
+            "/api/v1/ticker/price": 3
+        }
+    },
+    "rate_limit": {
+        "rate": 10,
+        "burst": 20,
+        "max_concurrency": 10,
+        "reserve_tokens": 3,
+        "shed_queue_depth": 20,
+        "max_wait": 5
+    },
+    "cache": {
+        "/api/v1/capital": 2,
+        "/api/v1/positions": 1,
+        "/api/v1/open-orders": 1
+    },
+    "retry": {
+        "max_attempts": 3,
+        "base_delay": 0.2,
+        "max_delay": 5
+    },
+    "circuit_breaker": {
+        "failure_threshold": 5,
+        "reset_timeout": 10
+    },
+    "metrics": {
+        "report_interval": 300
+    },
+    "candles": {
+        "timeframes": {"1s": 1, "1m": 60, "5m": 300, "1h": 3600},
+        "history": 500
+    },
+    "clock": {
+        "recv_window": 5000,
+        "sync_interval": 300
+    },
+    "stream": {
+        "enabled": True,
+        "max_price_age": 3,
+        "check_interval": 1,
+        "orderbook": False,
+        "orderbook_depth": 100,
+        "history_size": 1024,
+        "account": True,
+        "fill_timeout": 10,
+        "reconcile_interval": 300,
+        "ping_interval": 10,
+        "ping_timeout": 5,
+        "idle_timeout": 30,
+        "reconnect_base_delay": 0.5,
+        "reconnect_max_delay": 30,
+        "decode_in_thread": False
+    },
+    "funding": {
+        "enabled": False,
+        "threshold": 0.0001,
+        "check_interval": 300,
+        "top": 10,
+        "avoid_paying": False
+    },
+    "journal": {
+        "enabled": True,
+        "path": "bot_state.journal",
+        "flush_interval": 0.2,
+        "compact_every": 1000
+    },
     "trading": {
         "leverage": 20,
         "profit_percentage": 2,
         "stop_loss_percentage": 10,
         "cooldown_minutes": 30,
-        "symbol": "ETH_USDC_PERP"
+        "symbol": "ETH_USDC_PERP",
+        "symbols": [],
+        "overrides": {},
+        "exchange_exits": True,
+        "exit_grace": 3,
+        "strategy": "long",
+        "grid": {
+            "lower": 0,
+            "upper": 0,
+            "range_percentage": 5,
+            "levels": 20,
+            "spacing": "arithmetic",
+            "quantity": 0
+        }
     }
 }
 
-class BackpackAPI:
-    def __init__(self, api_key: str, api_secret: str, base_url: str, ws_url: str, logger):
-        self.api_key = api_key
-        self.api_secret = api_secret
-        self.base_url = base_url
-        self.ws_url = ws_url
-        self.logger = logger
-        self.session = None
-        self.ws = None
-        self.prices = {}
-
-    async def initialize(self):
-        """初始化HTTP会话"""
-        if self.session is None:
-            self.session = aiohttp.ClientSession()
-        return self
-
-    async def close(self):
-        """关闭HTTP会话"""
-        if self.session:
-            await self.session.close()
-            self.session = None
-
-    def _generate_signature(self, timestamp: int, method: str, request_path: str, body: dict = None) -> str:
-        """生成API请求的签名"""
-        body_str = "" if body is None else json.dumps(body)
-        message = f"{timestamp}{method}{request_path}{body_str}"
-        signature = hmac.new(
-            self.api_secret.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-        return signature
-
-    async def _make_request(self, method: str, endpoint: str, params: dict = None, data: dict = None) -> dict:
-        """发送API请求"""
-        await self.initialize()
-        url = f"{self.base_url}{endpoint}"
-        timestamp = int(time.time() * 1000)
-        headers = {
-            "X-API-KEY": self.api_key,
-            "X-TIMESTAMP": str(timestamp),
-            "Content-Type": "application/json"
-        }
-
-        # 添加查询参数到URL
-        if params:
-            query_string = urllib.parse.urlencode(params)
-            url = f"{url}?{query_string}"
-            request_path = f"{endpoint}?{query_string}"
-        else:
-            request_path = endpoint
-
-        # 添加签名
-        signature = self._generate_signature(timestamp, method, request_path, data)
-        headers["X-SIGNATURE"] = signature
-
-        try:
-            async with getattr(self.session, method.lower())(
-                url,
-                headers=headers,
-                json=data
-            ) as response:
-                response_data = await response.json()
-                if response.status != 200:
-                    self.logger.error(f"API请求失败: {response.status} - {response_data}")
-                return response_data
-        except Exception as e:
-            self.logger.error(f"请求异常: {e}")
-            return {"error": str(e)}
-
-    async def get_balances(self) -> List[Dict]:
-        """获取账户余额"""
-        try:
-            response = await self._make_request("GET", "/api/v1/capital")
-            if "error" in response:
-                self.logger.error(f"获取余额失败: {response['error']}")
-                return []
-            return response
-        except Exception as e:
-            self.logger.error(f"获取余额异常: {str(e)}")
-            self.logger.error(traceback.format_exc())
-            return []
-
-    async def get_price(self, symbol: str) -> float:
-        """获取当前价格"""
-        try:
-            response = await self._make_request("GET", "/api/v1/ticker/price", {"symbol": symbol})
-            if "price" in response:
-                return float(response["price"])
-            
-            if "error" in response:
-                self.logger.error(f"获取价格错误: {response['error']}")
-            return 0
-        except Exception as e:
-            self.logger.error(f"获取价格异常: {str(e)}")
-            self.logger.error(traceback.format_exc())
-            return 0
-
-    async def get_position(self, symbol: str) -> Optional[Dict]:
-        """获取特定交易对的仓位"""
-        try:
-            positions = await self.get_positions()
-            for position in positions:
-                if position["symbol"] == symbol and float(position["quantity"]) != 0:
-                    return position
-            return None
-        except Exception as e:
-            self.logger.error(f"获取仓位异常: {str(e)}")
-            self.logger.error(traceback.format_exc())
-            return None
-
-    async def get_positions(self) -> List[Dict]:
-        """获取所有持仓"""
-        try:
-            response = await self._make_request("GET", "/api/v1/positions")
-            if isinstance(response, list):
-                return response
-            if "error" in response:
-                self.logger.error(f"获取持仓失败: {response['error']}")
-            return []
-        except Exception as e:
-            self.logger.error(f"获取持仓异常: {str(e)}")
-            self.logger.error(traceback.format_exc())
-            return []
-
-    async def place_order(self, symbol: str, side: str, quantity: float, 
-                         order_type: str = "MARKET", price: float = None,
-                         post_only: bool = False, reduce_only: bool = False) -> Dict:
-        """下单"""
-        try:
-            # 验证参数
-            if not symbol or not side or quantity <= 0:
-                self.logger.error(f"下单参数无效: symbol={symbol}, side={side}, quantity={quantity}")
-                return {"error": "参数无效"}
-                
-            order_data = {
-                "symbol": symbol,
-                "side": side,
-                "type": order_type,
-                "quantity": str(quantity)
-            }
-
-            if price and order_type == "LIMIT":
-                order_data["price"] = str(price)
-            if post_only:
-                order_data["postOnly"] = "true"
-            if reduce_only:
-                order_data["reduceOnly"] = "true"
-
-            client_id = str(uuid.uuid4())
-            order_data["clientId"] = client_id
-
-            self.logger.info(f"发送订单: {order_data}")
-            response = await self._make_request("POST", "/api/v1/order", None, order_data)
-            
-            if "error" in response:
-                self.logger.error(f"下单失败: {response['error']}")
-            else:
-                self.logger.info(f"订单已提交: {response}")
-                
-            return response
-        except Exception as e:
-            self.logger.error(f"下单异常: {str(e)}")
-            self.logger.error(traceback.format_exc())
-            return {"error": str(e)}
-
-    async def cancel_order(self, symbol: str, order_id: str) -> Dict:
-        """取消特定订单"""
-        try:
-            params = {
-                "symbol": symbol,
-                "orderId": order_id
-            }
-            self.logger.info(f"取消订单: {params}")
-            response = await self._make_request("DELETE", "/api/v1/order", params)
-            
-            if "error" in response:
-                self.logger.error(f"取消订单失败: {response['error']}")
-            else:
-                self.logger.info(f"订单已取消: {response}")
-                
-            return response
-        except Exception as e:
-            self.logger.error(f"取消订单异常: {str(e)}")
-            self.logger.error(traceback.format_exc())
-            return {"error": str(e)}
-
-    async def cancel_all_orders(self, symbol: str = None) -> Dict:
-        """取消所有订单，可选指定交易对"""
-        try:
-            params = {}
-            if symbol:
-                params["symbol"] = symbol
-                
-            self.logger.info(f"取消所有订单: {params if symbol else '所有交易对'}")
-            response = await self._make_request("DELETE", "/api/v1/orders", params)
-            
-            if "error" in response:
-                self.logger.error(f"取消所有订单失败: {response['error']}")
-            else:
-                self.logger.info(f"所有订单已取消: {response}")
-                
-            return response
-        except Exception as e:
-            self.logger.error(f"取消所有订单异常: {str(e)}")
-            self.logger.error(traceback.format_exc())
-            return {"error": str(e)}
-
-    async def start_ws_price_stream(self):
-        """启动WebSocket价格数据流"""
-        # 这是一个简化版本的实现
-        pass
-
 class TelegramBot:
     def __init__(self, token: str, chat_id: str):
         self.token = token
@@ -388,111 +269,554 @@ class TelegramBot:
                 
         return await self.send_message(message)
 
-class TradingBot:
-    def __init__(self, config: dict):
-        self.config = config
-        self.backpack_api = BackpackAPI(
-            api_key=config["backpack"]["api_key"],
-            api_secret=config["backpack"]["api_secret"],
-            base_url=config["backpack"]["base_url"],
-            ws_url=config["backpack"]["ws_url"],
-            logger=logger
-        )
-        self.telegram = TelegramBot(
-            token=config["telegram"]["token"],
-            chat_id=config["telegram"]["chat_id"]
+class WakeupScheduler:
+    """事件驱动的唤醒调度
+
+    每个等待方(交易对或主循环)有一个唤醒事件。价格越过止盈止损线、收到账户推送时立即唤醒；
+    冷静期结束、重试等定时唤醒交给事件循环的定时器堆(loop.call_later)，同名定时器重设时覆盖旧的。
+    """
+    def __init__(self):
+        self._events = {}
+        self._timers = {}
+        self.wakeups = {}
+
+    def _event(self, key: str) -> asyncio.Event:
+        event = self._events.get(key)
+        if event is None:
+            event = self._events[key] = asyncio.Event()
+        return event
+
+    def wake(self, key: str, reason: str = "event"):
+        """立即唤醒等待方"""
+        self.wakeups[reason] = self.wakeups.get(reason, 0) + 1
+        self._event(key).set()
+
+    def schedule(self, key: str, name: str, delay: float):
+        """在delay秒后唤醒等待方，同名定时器只保留最新的一个"""
+        self.cancel(key, name)
+        loop = asyncio.get_running_loop()
+        self._timers[(key, name)] = loop.call_later(max(0.0, delay), self._fire, key, name)
+
+    def cancel(self, key: str, name: str):
+        """取消定时唤醒"""
+        handle = self._timers.pop((key, name), None)
+        if handle is not None:
+            handle.cancel()
+
+    def _fire(self, key: str, name: str):
+        self._timers.pop((key, name), None)
+        self.wake(key, name)
+
+    async def wait(self, key: str, timeout: Optional[float] = None) -> bool:
+        """等待唤醒或超时，返回是否被唤醒"""
+        event = self._event(key)
+        if not event.is_set():
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        woken = event.is_set()
+        event.clear()
+        return woken
+
+    def close(self):
+        """取消所有定时器"""
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+
+class StateJournal:
+    """交易状态日志，重启后无需查询交易所即可恢复入场价、冷静期和止盈止损单
+
+    每条记录是一行JSON，按键(交易对)覆盖，读取时后写的记录生效。状态变化只写入内存，
+    由后台任务在flush_interval内合并成一次写入和一次fsync；记录数超过compact_every后
+    改写为每个键只保留最新状态的新文件，并原子替换旧文件。进程崩溃时最多丢失最后一个
+    批次，写了一半的最后一行在读取时截掉。
+    """
+    DEFAULT_OPTIONS = {
+        "path": "bot_state.journal",
+        "flush_interval": 0.2,
+        "compact_every": 1000
+    }
+
+    def __init__(self, options: Optional[dict] = None):
+        options = {**self.DEFAULT_OPTIONS, **(options or {})}
+        self.path = options["path"]
+        self.flush_interval = options["flush_interval"]
+        self.compact_every = options["compact_every"]
+        self.state = {}
+        self.records = 0
+        self.flushes = 0
+        self._pending = []
+        self._dirty = None
+        self._task = None
+        self.load()
+
+    def load(self) -> Dict[str, dict]:
+        """读取日志文件，返回每个键的最新状态"""
+        self.state = {}
+        self.records = 0
+        try:
+            with open(self.path, "rb+") as f:
+                valid_end = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # 崩溃时写了一半的最后一行，截掉后再继续追加
+                        logger.warning(f"状态日志末尾记录不完整，已截断: {line[:80]!r}")
+                        f.truncate(valid_end)
+                        break
+                    valid_end += len(line)
+                    try:
+                        record = json.loads(line)
+                        self.state[record["k"]] = record["v"]
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning(f"状态日志存在损坏的记录，已跳过: {line[:80]!r}")
+                        continue
+                    self.records += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"读取状态日志失败: {e}")
+        return self.state
+
+    def get(self, key: str) -> Optional[dict]:
+        """键的最新状态"""
+        return self.state.get(key)
+
+    def record(self, key: str, value: dict):
+        """记录状态变化，与上次相同时不写入"""
+        if self.state.get(key) == value:
+            return
+        self.state[key] = value
+        self._pending.append(json.dumps({"k": key, "v": value, "t": time.time()}, ensure_ascii=False) + "\n")
+        if self._dirty is not None:
+            self._dirty.set()
+
+    def start(self):
+        """启动后台刷盘任务"""
+        if self._task is None or self._task.done():
+            self._dirty = asyncio.Event()
+            if self._pending:
+                self._dirty.set()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._dirty.wait()
+            # 等待一个批次窗口，把这段时间内的状态变化合并成一次fsync
+            await asyncio.sleep(self.flush_interval)
+            self._dirty.clear()
+            # 待写记录和压缩用的状态快照在事件循环线程取出，写文件的线程不接触可变状态
+            lines, snapshot = self._take_batch()
+            if not lines:
+                continue
+            try:
+                await loop.run_in_executor(None, self._write, lines, snapshot)
+            except Exception as e:
+                logger.error(f"写入状态日志失败: {e}")
+                self._pending = lines + self._pending
+                self._dirty.set()
+                continue
+            self._commit(lines, snapshot)
+
+    def flush(self):
+        """把待写入的记录追加到文件并fsync，记录过多时压缩"""
+        lines, snapshot = self._take_batch()
+        if not lines:
+            return
+        try:
+            self._write(lines, snapshot)
+        except OSError:
+            self._pending = lines + self._pending
+            raise
+        self._commit(lines, snapshot)
+
+    def _take_batch(self) -> Tuple[List[str], Optional[dict]]:
+        """取出待写入的记录，需要压缩时附带当前状态的副本"""
+        lines, self._pending = self._pending, []
+        snapshot = None
+        if lines and self.records + len(lines) > self.compact_every:
+            snapshot = dict(self.state)
+        return lines, snapshot
+
+    def _commit(self, lines: List[str], snapshot: Optional[dict]):
+        """写入成功后更新计数"""
+        self.flushes += 1
+        if snapshot is not None:
+            self.records = len(snapshot)
+            logger.info(f"状态日志已压缩，保留 {self.records} 条记录")
+        else:
+            self.records += len(lines)
+
+    def _write(self, lines: List[str], snapshot: Optional[dict]):
+        """追加记录并fsync，有快照时随后压缩；只使用参数，可在线程池中执行"""
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        if snapshot is not None:
+            self.compact(snapshot)
+
+    def compact(self, snapshot: dict):
+        """用状态快照改写日志，每个键只保留最新状态"""
+        tmp_path = self.path + ".tmp"
+        now = time.time()
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key, value in snapshot.items():
+                f.write(json.dumps({"k": key, "v": value, "t": now}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        # 同步目录项，保证替换在断电后仍然有效
+        dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    async def close(self):
+        """停止后台任务并写入剩余记录"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            self.flush()
+        except OSError as e:
+            logger.error(f"写入状态日志失败: {e}")
+
+    def stats(self) -> dict:
+        return {"keys": len(self.state), "records": self.records, "flushes": self.flushes, "pending": len(self._pending)}
+
+class FundingScanner:
+    """资金费率扫描
+
+    每个check_interval用一次批量请求取回所有永续合约的资金费率，绝对值超过阈值的市场
+    按绝对值排序后发布给订阅方，设置了top时只取前top个。
+    """
+    DEFAULT_OPTIONS = {
+        "threshold": 0.0001,
+        "check_interval": 300,
+        "top": 10
+    }
+
+    def __init__(self, backpack_api: BackpackAPI, options: Optional[dict] = None):
+        options = {**self.DEFAULT_OPTIONS, **(options or {})}
+        self.backpack_api = backpack_api
+        self.threshold = abs(float(options["threshold"]))
+        self.check_interval = float(options["check_interval"])
+        self.top = int(options["top"])
+        self.latest = {}
+        self.candidates = []
+        self.last_scan = 0
+        self.scans = 0
+        self._callbacks = []
+        self._task = None
+
+    def register_callback(self, callback: Callable[[List[dict]], Any]):
+        """注册候选市场回调，每轮扫描后以候选列表调用"""
+        self._callbacks.append(callback)
+
+    def rate(self, symbol: str) -> Optional[float]:
+        """最近一次扫描得到的资金费率，未扫描到时返回None"""
+        return self.latest.get(symbol)
+
+    def rank(self, rates: Dict[str, float]) -> List[dict]:
+        """筛选费率绝对值超过阈值的市场，按绝对值从大到小排列
+
+        费率为正时多头向空头支付，收取资金费的一方为空头，反之为多头。
+        """
+        hits = [(symbol, rate) for symbol, rate in rates.items() if abs(rate) >= self.threshold]
+        if self.top > 0:
+            hits = heapq.nlargest(self.top, hits, key=lambda hit: abs(hit[1]))
+        else:
+            hits.sort(key=lambda hit: abs(hit[1]), reverse=True)
+        return [
+            {"symbol": symbol, "rate": rate, "receiver": "SHORT" if rate > 0 else "LONG"}
+            for symbol, rate in hits
+        ]
+
+    async def scan(self) -> List[dict]:
+        """执行一次扫描并发布候选市场"""
+        rates = await self.backpack_api.get_all_funding_rates(priority=PRIORITY_BACKGROUND)
+        if not rates:
+            return self.candidates
+        self.latest = rates
+        self.candidates = self.rank(rates)
+        self.last_scan = time.time()
+        self.scans += 1
+        logger.info(
+            f"资金费率扫描: {len(rates)} 个市场，{len(self.candidates)} 个超过阈值 {self.threshold}"
+            + (f"，最高 {self.candidates[0]['symbol']} {self.candidates[0]['rate']:+.6f}" if self.candidates else "")
         )
-        self.symbol = config["trading"]["symbol"]
-        self.leverage = config["trading"]["leverage"]
-        self.profit_percentage = config["trading"]["profit_percentage"]
-        self.stop_loss_percentage = config["trading"]["stop_loss_percentage"]
-        self.cooldown_minutes = config["trading"]["cooldown_minutes"]
-        self.is_running = False
-        self.task = None
+        for callback in self._callbacks:
+            try:
+                result = callback(self.candidates)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"资金费率回调异常: {e}")
+        return self.candidates
+
+    async def _run(self):
+        while True:
+            try:
+                await self.scan()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"资金费率扫描异常: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    def start(self):
+        """启动后台扫描任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台扫描任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"markets": len(self.latest), "candidates": len(self.candidates), "scans": self.scans}
+
+def trading_symbols(config: dict) -> List[str]:
+    """配置中的交易对列表，未配置symbols时只交易symbol"""
+    trading = config.get("trading", {})
+    symbols = trading.get("symbols") or [trading.get("symbol")]
+    if isinstance(symbols, str):
+        symbols = symbols.split(",")
+    result = []
+    for symbol in symbols:
+        symbol = (symbol or "").strip().upper()
+        if symbol and symbol not in result:
+            result.append(symbol)
+    return result
+
+class SymbolWorker:
+    """单个交易对的交易状态与策略，所有交易对共享TradingBot的API客户端"""
+    def __init__(self, bot: "TradingBot", symbol: str, trading_config: dict):
+        self.bot = bot
+        self.backpack_api = bot.backpack_api
+        self.telegram = bot.telegram
+        self.symbol = symbol
+        self.leverage = trading_config["leverage"]
+        self.profit_percentage = trading_config["profit_percentage"]
+        self.stop_loss_percentage = trading_config["stop_loss_percentage"]
+        self.cooldown_minutes = trading_config["cooldown_minutes"]
+        # 在交易所挂只减仓的止盈止损触发单，进程暂停或重启时也能按时离场
+        self.exchange_exits = trading_config.get("exchange_exits", True)
+        self.exit_grace = trading_config.get("exit_grace", 3)
+        self.exit_orders = {}
+        self.exit_basis = None
+        self.crossed_at = 0
         self.entry_price = 0
         self.position_size = 0
+        self.has_position = False
         self.in_cooldown = False
         self.cooldown_until = 0
-        self.check_interval = 10  # 默认检查间隔(秒)
+        self.last_trade_time = 0
+        self.last_status_log = 0
         self.last_price_check = 0
         self.last_position_check = 0
-        self.last_balance_check = 0
-        self.health_check_interval = 300  # 健康检查间隔(秒)
-        self.last_health_check = time.time()
+        self.last_cooldown_log = None
+        self.retry_open_at = 0
+        self.funding_blocked = False
+        # 交易循环异常后的退避，连续异常时从1秒逐步增加到30秒
+        self.error_backoff = RetryPolicy({"base_delay": 1, "max_delay": 30})
 
-    async def initialize(self):
-        """初始化交易机器人"""
-        try:
-            await self.backpack_api.initialize()
-            logger.info("交易机器人已初始化")
-            await self.telegram.send_message("🤖 交易机器人已启动")
-            return True
-        except Exception as e:
-            logger.error(f"初始化交易机器人异常: {str(e)}")
-            logger.error(traceback.format_exc())
-            await self.telegram.send_error_message("交易机器人初始化失败", str(e))
-            return False
+    def current_check_interval(self) -> float:
+        """当前的价格检查间隔，价格流新鲜时使用较短间隔，否则回退到REST轮询间隔"""
+        if self.bot.stream_enabled and self.backpack_api.is_price_fresh(self.symbol):
+            return self.bot.stream_check_interval
+        return self.bot.check_interval
 
-    async def stop(self):
-        """停止交易机器人"""
-        self.is_running = False
-        if self.task:
-            self.task.cancel()
+    @property
+    def take_profit_price(self) -> float:
+        """止盈价格"""
+        return self.entry_price * (1 + self.profit_percentage / 100)
+
+    @property
+    def stop_loss_price(self) -> float:
+        """止损价格"""
+        return self.entry_price * (1 - self.stop_loss_percentage / 100)
+
+    def on_price(self, price: float):
+        """推送价格越过止盈或止损线时立即唤醒交易循环"""
+        if self.has_position and self.entry_price > 0:
+            if price >= self.take_profit_price or price <= self.stop_loss_price:
+                self.bot.scheduler.wake(self.symbol, "price")
+
+    def enter_cooldown(self):
+        """止损后进入冷静期"""
+        self.in_cooldown = True
+        self.cooldown_until = time.time() + self.cooldown_minutes * 60
+        self.bot.scheduler.schedule(self.symbol, "cooldown", self.cooldown_minutes * 60)
+        self.persist()
+
+    def persist(self):
+        """把需要跨重启保留的状态写入状态日志"""
+        if self.bot.journal is None:
+            return
+        self.bot.journal.record(self.symbol, {
+            "entry_price": self.entry_price,
+            "position_size": self.position_size,
+            "in_cooldown": self.in_cooldown,
+            "cooldown_until": self.cooldown_until,
+            "exit_orders": dict(self.exit_orders),
+            "exit_basis": list(self.exit_basis) if self.exit_basis else None
+        })
+
+    def restore(self):
+        """从状态日志恢复上次运行的状态，持仓仍以交易所为准，在第一次检查时核对"""
+        state = self.bot.journal.get(self.symbol) if self.bot.journal is not None else None
+        if not state:
+            return
+        self.entry_price = float(state.get("entry_price") or 0)
+        self.position_size = float(state.get("position_size") or 0)
+        self.has_position = self.position_size > 0
+        self.exit_orders = dict(state.get("exit_orders") or {})
+        self.exit_basis = tuple(state["exit_basis"]) if state.get("exit_basis") else None
+        self.cooldown_until = float(state.get("cooldown_until") or 0)
+        self.in_cooldown = bool(state.get("in_cooldown")) and self.cooldown_until > time.time()
+        if self.in_cooldown:
+            self.bot.scheduler.schedule(self.symbol, "cooldown", self.cooldown_until - time.time())
+        logger.info(
+            f"{self.symbol} 已从状态日志恢复: 入场价 {self.entry_price}，数量 {self.position_size}，"
+            f"冷静期 {'至 ' + datetime.datetime.fromtimestamp(self.cooldown_until).strftime('%Y-%m-%d %H:%M:%S') if self.in_cooldown else '无'}，"
+            f"止盈止损单 {self.exit_orders}"
+        )
+
+    async def exit_targets(self) -> Tuple[float, float, float]:
+        """按交易对精度取整后的(止盈触发价, 止损触发价, 数量)，也是判断触发单是否需要重挂的依据"""
+        tick_size = await self.backpack_api.get_tick_size(self.symbol)
+        step_size = await self.backpack_api.get_step_size(self.symbol)
+        return (
+            BackpackAPI.round_to_tick(self.take_profit_price, tick_size),
+            BackpackAPI.round_to_tick(self.stop_loss_price, tick_size),
+            BackpackAPI.floor_to_step(self.position_size, step_size)
+        )
+
+    async def place_exit_orders(self, targets: Optional[Tuple[float, float, float]] = None):
+        """按当前入场价和持仓数量在交易所挂止盈止损触发单"""
+        if not self.exchange_exits or self.entry_price <= 0 or self.position_size <= 0:
+            return
+        if targets is None:
+            targets = await self.exit_targets()
+        take_profit, stop_loss, quantity = targets
+        orders = {}
+        for reason, trigger_price in (("止盈", take_profit), ("止损", stop_loss)):
+            orders[reason] = {
+                "symbol": self.symbol,
+                "side": "SELL",
+                "quantity": quantity,
+                "order_type": "MARKET",
+                "reduce_only": True,
+                "trigger_price": trigger_price,
+                "client_id": str(uuid.uuid4())
+            }
+        # 止盈止损两张单合并为一个批量请求
+        results = await self.backpack_api.place_orders(list(orders.values()))
+        for reason, order in orders.items():
+            result = results.get(order["client_id"], {})
+            if "id" in result or "orderId" in result:
+                self.exit_orders[reason] = str(result.get("id") or result.get("orderId"))
+            else:
+                logger.error(f"{self.symbol} {reason}触发单提交失败: {result.get('error')}，将由本地检查平仓")
+        self.exit_basis = targets
+        logger.info(f"{self.symbol} 交易所止盈止损单: {self.exit_orders}")
+
+    async def cancel_exit_orders(self):
+        """撤销尚未触发的止盈止损单"""
+        order_ids = list(self.exit_orders.values())
+        statuses = await asyncio.gather(*(self.backpack_api.lookup_order_status(self.symbol, order_id) for order_id in order_ids))
+        pending = [order_id for order_id, status in zip(order_ids, statuses) if status not in BackpackAPI.ORDER_FINAL_STATUSES]
+        if pending:
+            await self.backpack_api.cancel_orders(self.symbol, pending)
+        self.exit_orders = {}
+        self.exit_basis = None
+        self.crossed_at = 0
+
+    async def sync_exit_orders(self, startup: bool = False):
+        """持仓变化(加仓、入场价调整)或重启后重新挂止盈止损单
+
+        Args:
+            startup: 是否为重启后首次发现持仓，此时撤掉交易所上遗留的触发单
+        """
+        if not self.exchange_exits:
+            return
+        # 入场价的微小差异(成交均价与交易所entryPrice)取整后相同时不重挂，避免撤单到重挂之间没有止损
+        targets = await self.exit_targets()
+        if startup:
+            leftovers = [
+                order.get("id") or order.get("orderId")
+                for order in await self.backpack_api.get_open_orders(self.symbol)
+                if order.get("triggerPrice") and order.get("reduceOnly")
+            ]
+            if leftovers:
+                await self.backpack_api.cancel_orders(self.symbol, leftovers)
+        elif self.exit_basis is not None and tuple(self.exit_basis) == targets:
+            return
+        await self.cancel_exit_orders()
+        await self.place_exit_orders(targets)
+
+    async def handle_exit_fill(self):
+        """持仓在交易所侧被平掉：确认是哪张触发单成交，并撤掉另一张
+
+        两张触发单都没有成交时，先通过REST重新确认持仓；持仓仍在或无法确认时保留触发单不动。
+        """
+        filled = None
+        for reason, order_id in self.exit_orders.items():
+            if await self.backpack_api.lookup_order_status(self.symbol, order_id) == "Filled":
+                filled = reason
+
+        if filled is None:
             try:
-                await self.task
-            except asyncio.CancelledError:
-                pass
-        await self.backpack_api.close()
-        await self.telegram.send_message("🛑 交易机器人已停止")
-        logger.info("交易机器人已停止")
+                position = await self.backpack_api.get_position(self.symbol, priority=PRIORITY_ORDER, use_stream=False)
+            except AccountReadError as e:
+                logger.warning(f"{self.symbol} 止盈止损单均未成交且持仓无法确认，保留触发单: {e}")
+                self.has_position = True
+                return
+            if position is not None and float(position.get("quantity", 0)) > 0:
+                logger.warning(f"{self.symbol} 持仓仍然存在，保留止盈止损单")
+                self.has_position = True
+                return
 
-    async def health_check(self) -> bool:
-        """健康检查，确保API连接正常"""
-        try:
-            # 检查账户余额
-            balances = await self.backpack_api.get_balances()
-            if not balances and not isinstance(balances, list):
-                logger.warning("健康检查: 获取余额失败")
-                return False
-                
-            # 检查市场价格
-            price = await self.backpack_api.get_price(self.symbol)
-            if price <= 0:
-                logger.warning(f"健康检查: 获取{self.symbol}价格失败")
-                return False
-                
-            # 检查持仓信息
-            positions = await self.backpack_api.get_positions()
-            if not isinstance(positions, list):
-                logger.warning("健康检查: 获取持仓信息失败")
-                return False
-                
-            logger.info("健康检查: API连接正常")
-            return True
-            
-        except Exception as e:
-            logger.error(f"健康检查异常: {str(e)}")
-            logger.error(traceback.format_exc())
-            return False
+        await self.cancel_exit_orders()
 
-    async def get_usable_balance(self) -> float:
-        """获取可用的USDC余额"""
-        try:
-            current_time = time.time()
-            # 限制API请求频率
-            if current_time - self.last_balance_check < 10:  # 至少10秒检查一次
-                return 0
-                
-            self.last_balance_check = current_time
-            balances = await self.backpack_api.get_balances()
-            for balance in balances:
-                if balance["asset"] == "USDC":
-                    return float(balance["available"])
-            return 0
-        except Exception as e:
-            logger.error(f"获取余额异常: {str(e)}")
-            logger.error(traceback.format_exc())
-            return 0
+        if filled is None:
+            logger.warning(f"{self.symbol} 持仓已不存在，但止盈止损单均未成交")
+        else:
+            await self.telegram.send_message(f"✅ {self.symbol} 交易所{filled}单已成交，入场价: {self.entry_price}")
+            logger.info(f"{self.symbol} 交易所{filled}单已成交")
+            if filled == "止损":
+                self.enter_cooldown()
+                await self.telegram.send_message(f"⏳ {self.symbol} 进入冷静期，{self.cooldown_minutes}分钟内不开仓")
+        self.entry_price = 0
+        self.position_size = 0
+
+    def idle_timeout(self) -> float:
+        """没有事件时的最长等待时间
+
+        价格推送和账户推送都在线时，唤醒完全由事件驱动，超时只作为兜底检查；
+        否则按原有间隔轮询。
+        """
+        if self.in_cooldown:
+            return max(0.0, min(60, self.cooldown_until - time.time()))  # 冷静期每分钟记录一次
+        if self.bot.stream_enabled and self.backpack_api.is_price_fresh(self.symbol):
+            if self.backpack_api.is_account_stream_live() or self.has_position:
+                return self.bot.check_interval
+        return self.current_check_interval()
 
     async def calculate_position_size(self, balance: float, price: float) -> float:
         """计算开仓数量，使用杠杆"""
@@ -500,12 +824,12 @@ class TradingBot:
             if balance <= 0 or price <= 0:
                 return 0
                 
-            # 使用全部余额的杠杆倍数
+            # 使用分配到的余额的杠杆倍数
             usdc_value = balance * self.leverage
-            # 转换为ETH数量
-            eth_amount = usdc_value / price
+            # 转换为币的数量
+            amount = usdc_value / price
             # 保留6位小数
-            return round(eth_amount, 6)
+            return round(amount, 6)
         except Exception as e:
             logger.error(f"计算仓位大小异常: {str(e)}")
             logger.error(traceback.format_exc())
@@ -515,7 +839,7 @@ class TradingBot:
         """开多仓"""
         try:
             # 获取余额和价格
-            balance = await self.get_usable_balance()
+            balance = await self.bot.allocated_balance()
             if balance <= 0:
                 await self.telegram.send_message("❌ 账户余额不足，无法开仓")
                 return False
@@ -541,8 +865,17 @@ class TradingBot:
             )
 
             if "orderId" in order_result:
+                fill = await self.bot.wait_for_fill(order_result)
+                if fill is not None and float(fill.get("executedQuantity") or 0) <= 0:
+                    await self.telegram.send_error_message("开仓失败", f"订单未成交: {fill.get('status')}")
+                    logger.error(f"开仓订单未成交: {fill}")
+                    return False
+                price = self.bot.fill_price(fill, price)
+                if fill is not None:
+                    quantity = float(fill["executedQuantity"])
                 self.entry_price = price
                 self.position_size = quantity
+                await self.sync_exit_orders()
                 
                 # 构建通知消息
                 message = (
@@ -561,7 +894,10 @@ class TradingBot:
                 await self.telegram.send_error_message(f"开仓失败", error_msg)
                 logger.error(f"开仓失败: {error_msg}")
                 return False
-                
+
+        except AccountReadError as e:
+            logger.warning(f"{self.symbol} 账户数据读取失败，暂不开仓: {e}")
+            return False
         except Exception as e:
             logger.error(f"开仓异常: {str(e)}")
             logger.error(traceback.format_exc())
@@ -571,12 +907,20 @@ class TradingBot:
     async def close_position(self, reason: str) -> bool:
         """平仓"""
         try:
-            position = await self.backpack_api.get_position(self.symbol)
+            try:
+                position = await self.backpack_api.get_position(self.symbol, priority=PRIORITY_ORDER)
+            except AccountReadError as e:
+                logger.warning(f"{self.symbol} 持仓读取失败，暂不平仓: {e}")
+                return False
             if not position or float(position.get("quantity", 0)) == 0:
-                await self.telegram.send_message(f"ℹ️ 没有持仓，无需平仓")
+                await self.telegram.send_message(f"ℹ️ {self.symbol} 没有持仓，无需平仓")
                 return False
 
             quantity = abs(float(position["quantity"]))
+
+            # 先撤销交易所上的止盈止损单，避免与本次平仓重复成交
+            if self.exit_orders:
+                await self.cancel_exit_orders()
             
             # 获取当前价格
             current_price = await self.backpack_api.get_price(self.symbol)
@@ -600,6 +944,13 @@ class TradingBot:
             )
 
             if "orderId" in order_result:
+                fill = await self.bot.wait_for_fill(order_result)
+                if fill is not None and float(fill.get("executedQuantity") or 0) <= 0:
+                    await self.telegram.send_error_message("平仓失败", f"订单未成交: {fill.get('status')}")
+                    logger.error(f"平仓订单未成交: {fill}")
+                    return False
+                current_price = self.bot.fill_price(fill, current_price)
+
                 # 计算盈亏
                 profit_loss = (current_price - entry_price) / entry_price * 100 if entry_price > 0 else 0
                 
@@ -617,12 +968,11 @@ class TradingBot:
                 
                 # 如果是止损触发，进入冷静期
                 if reason == "止损":
-                    self.in_cooldown = True
-                    self.cooldown_until = time.time() + self.cooldown_minutes * 60
+                    self.enter_cooldown()
                     cooldown_end_time = datetime.datetime.fromtimestamp(self.cooldown_until).strftime('%Y-%m-%d %H:%M:%S')
                     
                     await self.telegram.send_message(
-                        f"⏳ 进入冷静期，{self.cooldown_minutes}分钟内不开仓\n"
+                        f"⏳ {self.symbol} 进入冷静期，{self.cooldown_minutes}分钟内不开仓\n"
                         f"⏱️ 冷静期结束时间: {cooldown_end_time}"
                     )
                     logger.info(f"进入冷静期，结束时间: {cooldown_end_time}")
@@ -643,8 +993,673 @@ class TradingBot:
             await self.telegram.send_error_message("平仓过程中发生异常", str(e))
             return False
 
+    async def step(self):
+        """执行一次检查：冷静期、持仓同步、开仓或止盈止损"""
+        current_time = time.time()
+
+        # 检查是否在冷静期
+        if self.in_cooldown:
+            if current_time >= self.cooldown_until:
+                self.in_cooldown = False
+                await self.telegram.send_message(f"✅ {self.symbol} 冷静期结束，恢复交易")
+                logger.info(f"{self.symbol} 冷静期结束，恢复交易")
+            else:
+                remaining_minutes = int((self.cooldown_until - current_time) / 60)
+                if remaining_minutes % 5 == 0 and remaining_minutes != self.last_cooldown_log:  # 每5分钟记录一次
+                    logger.info(f"{self.symbol} 冷静期中，剩余{remaining_minutes}分钟")
+                    self.last_cooldown_log = remaining_minutes
+                return
+
+        # 检查是否有持仓，推送在线时读取内存无需请求，否则每30秒查询一次；
+        # 刚成交后持仓推送可能晚于订单推送，短时间内保留本地判断
+        account_live = self.backpack_api.is_account_stream_live()
+        stream_ready = account_live and current_time - self.last_trade_time >= self.bot.fill_timeout
+        if stream_ready or current_time - self.last_position_check >= 30:
+            # 持仓决定是否开仓，按下单优先级读取；读取失败时不做任何判断，下次唤醒重试
+            try:
+                position = await self.backpack_api.get_position(self.symbol, priority=PRIORITY_ORDER)
+            except AccountReadError as e:
+                logger.warning(f"{self.symbol} 持仓读取失败，跳过本次检查: {e}")
+                return
+            had_position = self.has_position
+            self.has_position = bool(position and float(position.get("quantity", 0)) > 0)
+            self.last_position_check = current_time
+
+            # 如果API返回了持仓信息，更新本地记录，并让交易所触发单跟随持仓变化
+            if self.has_position:
+                self.entry_price = float(position.get("entryPrice", self.entry_price))
+                self.position_size = float(position.get("quantity", self.position_size))
+                await self.sync_exit_orders(startup=not had_position and not self.exit_orders)
+            elif had_position and self.exit_orders:
+                await self.handle_exit_fill()
+                return
+
+        if not self.has_position:
+            # 没有持仓，且不在冷静期，开仓；开仓失败后5秒内不重试
+            if current_time < self.retry_open_at:
+                return
+            if self.bot.funding_blocks_long(self.symbol):
+                if not self.funding_blocked:
+                    logger.info(f"{self.symbol} 资金费率 {self.bot.funding_scanner.rate(self.symbol):+.6f} 超过阈值，暂不开多")
+                    self.funding_blocked = True
+                return
+            self.funding_blocked = False
+            logger.info(f"{self.symbol} 没有持仓，准备开仓...")
+            success = await self.open_long_position()
+            if success:
+                self.has_position = True
+                self.last_position_check = self.last_trade_time = time.time()
+            else:
+                self.retry_open_at = time.time() + 5
+                self.bot.scheduler.schedule(self.symbol, "retry", 5)
+            return
+
+        # 有持仓，检查止盈止损；价格来自推送时每次唤醒都检查，否则按间隔查询REST
+        price_fresh = self.bot.stream_enabled and self.backpack_api.is_price_fresh(self.symbol)
+        if not price_fresh and current_time - self.last_price_check < self.current_check_interval():
+            return
+        current_price = await self.backpack_api.get_price(self.symbol, max_age=self.bot.stop_price_age)
+        self.last_price_check = current_time
+
+        if current_price <= 0:
+            logger.warning(f"获取{self.symbol}价格失败，跳过本次检查")
+            return
+
+        # 确保有有效的入场价
+        if self.entry_price <= 0:
+            try:
+                position = await self.backpack_api.get_position(self.symbol)
+            except AccountReadError:
+                position = None
+            if position and "entryPrice" in position:
+                self.entry_price = float(position["entryPrice"])
+            else:
+                logger.warning(f"{self.symbol} 无法获取有效的入场价格，跳过本次检查")
+                return
+
+        # 计算盈亏比例
+        profit_percentage = (current_price - self.entry_price) / self.entry_price * 100
+
+        # 日志记录当前状态，价格流模式下按原检查间隔记录，避免刷屏
+        if current_time - self.last_status_log >= self.bot.check_interval:
+            logger.info(f"当前持仓: {self.symbol}, 入场价: {self.entry_price}, 当前价: {current_price}, 盈亏: {profit_percentage:.2f}%")
+            self.last_status_log = current_time
+
+        # 检查止盈止损
+        if profit_percentage >= self.profit_percentage:
+            reason = "止盈"
+        elif profit_percentage <= -self.stop_loss_percentage:
+            reason = "止损"
+        else:
+            self.crossed_at = 0
+            return
+
+        # 交易所触发单应当已经执行，宽限期后仍有持仓才由本地平仓兜底
+        if self.exit_orders:
+            if not self.crossed_at:
+                self.crossed_at = current_time
+                self.bot.scheduler.schedule(self.symbol, "exit_grace", self.exit_grace)
+            if current_time - self.crossed_at < self.exit_grace:
+                return
+            logger.warning(f"{self.symbol} 交易所{reason}单{self.exit_grace}秒内未成交，本地平仓")
+
+        logger.info(f"{self.symbol} 达到{reason}条件 ({profit_percentage:+.2f}%)，准备平仓...")
+        if await self.close_position(reason):
+            self.has_position = False
+            self.last_position_check = self.last_trade_time = time.time()
+        else:
+            # 平仓未完成(持仓读取失败或下单失败)，下次唤醒重新确认持仓，不当作已空仓
+            self.last_position_check = 0
+
+    async def run(self):
+        """交易对的交易循环，异常只影响本交易对"""
+        consecutive_errors = 0
+        loop_errors = 0
+        self.restore()
+        logger.info(f"{self.symbol} 交易循环已启动")
+
+        while self.bot.is_running:
+            try:
+                await self.step()
+                self.persist()
+
+                # 等待下一个事件：价格越线、账户推送、定时器，或兜底超时
+                loop_errors = 0
+                await self.bot.scheduler.wait(self.symbol, self.idle_timeout())
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.symbol} 交易循环异常: {str(e)}")
+                logger.error(traceback.format_exc())
+
+                consecutive_errors += 1
+                if consecutive_errors >= 3:
+                    await self.telegram.send_error_message(
+                        f"{self.symbol} 交易循环异常",
+                        f"连续{consecutive_errors}次出现异常: {str(e)}\n机器人将继续尝试运行。"
+                    )
+                    # 减少通知频率
+                    consecutive_errors = 0
+
+                # 发生异常后按指数退避等待，交易所恢复后能在数秒内继续
+                delay = self.error_backoff.backoff(loop_errors)
+                loop_errors += 1
+                logger.info(f"{self.symbol} 交易循环将在 {delay:.1f} 秒后重试")
+                await asyncio.sleep(delay)
+
+        logger.info(f"{self.symbol} 交易循环已停止")
+
+class GridLadder:
+    """网格价格阶梯
+
+    各档价格按升序保存在array中，定位价格所在档位和本次价格变动越过的档位都是二分查找，
+    每档最多挂一张订单，订单ID到档位的映射用于成交后快速找到对应档位。
+    """
+    EMPTY = 0
+    BUY = 1
+    SELL = -1
+
+    def __init__(self, lower: float, upper: float, levels: int, spacing: str = "arithmetic"):
+        if lower <= 0 or upper <= lower or levels < 2:
+            raise ValueError(f"网格参数无效: lower={lower}, upper={upper}, levels={levels}")
+        if spacing == "geometric":
+            ratio = (upper / lower) ** (1 / (levels - 1))
+            prices = [lower * ratio ** i for i in range(levels)]
+        elif spacing == "arithmetic":
+            step = (upper - lower) / (levels - 1)
+            prices = [lower + step * i for i in range(levels)]
+        else:
+            raise ValueError(f"不支持的网格间距: {spacing}")
+        self.spacing = spacing
+        self.prices = array.array("d", prices)
+        self.sides = array.array("b", bytes(levels))
+        self.order_ids = [None] * levels
+        self.orders = {}
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def locate(self, price: float) -> int:
+        """价格之下(含)的档位数量，即价格所在的区间"""
+        return bisect.bisect_right(self.prices, price)
+
+    def crossed(self, old_price: float, new_price: float) -> range:
+        """两次价格之间越过的档位"""
+        low, high = (old_price, new_price) if old_price <= new_price else (new_price, old_price)
+        return range(bisect.bisect_left(self.prices, low), bisect.bisect_right(self.prices, high))
+
+    def assign(self, index: int, side: int, order_id: str):
+        """记录档位上挂出的订单"""
+        self.sides[index] = side
+        self.order_ids[index] = order_id
+        self.orders[order_id] = index
+
+    def release(self, index: int):
+        """档位上的订单成交或撤销后清空"""
+        order_id = self.order_ids[index]
+        if order_id is not None:
+            self.orders.pop(order_id, None)
+        self.sides[index] = self.EMPTY
+        self.order_ids[index] = None
+
+    def initial_orders(self, price: float) -> List[Tuple[int, int]]:
+        """按当前价格生成初始挂单：下方各档买入，上方各档卖出，离当前价最近的一档留空"""
+        split = self.locate(price)
+        nearby = [index for index in (split - 1, split) if 0 <= index < len(self.prices)]
+        empty = min(nearby, key=lambda index: abs(self.prices[index] - price))
+        return [
+            (index, self.BUY if index < empty else self.SELL)
+            for index in range(len(self.prices)) if index != empty
+        ]
+
+class GridWorker:
+    """单个交易对的网格交易
+
+    每档挂一张限价单，买单成交后在上一档挂卖单，卖单成交后在下一档挂买单。
+    成交由账户推送唤醒立即处理；没有账户推送时，只查询价格变动越过的档位上的订单，
+    价格推送也不可用时每次检查通过REST查询价格来判断越过的档位。
+    """
+    def __init__(self, bot: "TradingBot", symbol: str, trading_config: dict):
+        self.bot = bot
+        self.backpack_api = bot.backpack_api
+        self.telegram = bot.telegram
+        self.symbol = symbol
+        grid_config = trading_config.get("grid", {})
+        self.lower = float(grid_config.get("lower", 0))
+        self.upper = float(grid_config.get("upper", 0))
+        self.levels = int(grid_config.get("levels", 20))
+        self.spacing = grid_config.get("spacing", "arithmetic")
+        self.range_percentage = float(grid_config.get("range_percentage", 5))
+        self.quantity = float(grid_config.get("quantity", 0))
+        self.ladder = None
+        self.last_price = 0
+        self.pending_checks = set()
+        self.retry_start_at = 0
+        self.fills = 0
+        # 由网格买单成交后挂出的卖单档位，只有这些卖单成交才算一次低买高卖
+        self.bought_levels = set()
+        self.round_trips = 0
+        self.grid_profit = 0.0
+        self.in_cooldown = False
+        # 交易循环异常后的退避，连续异常时从1秒逐步增加到30秒
+        self.error_backoff = RetryPolicy({"base_delay": 1, "max_delay": 30})
+
+    @property
+    def has_position(self) -> bool:
+        """网格已经铺好时视为占用资金"""
+        return self.ladder is not None
+
+    def track_price(self, price: float) -> bool:
+        """记录价格变动越过的挂单档位，返回是否有待确认的档位"""
+        ladder = self.ladder
+        if ladder is None:
+            return False
+        if self.last_price > 0:
+            for index in ladder.crossed(self.last_price, price):
+                if ladder.order_ids[index] is not None:
+                    self.pending_checks.add(index)
+        self.last_price = price
+        return bool(self.pending_checks)
+
+    def on_price(self, price: float):
+        """价格越过挂有订单的档位时唤醒，交给交易循环确认成交"""
+        if self.track_price(price):
+            self.bot.scheduler.wake(self.symbol, "price")
+
+    async def place_level(self, index: int, side: int) -> bool:
+        """在指定档位挂限价单"""
+        return await self.place_levels([(index, side)]) == 1
+
+    async def place_levels(self, levels: List[Tuple[int, int]], replace_all: bool = False) -> int:
+        """批量在多个档位挂限价单，返回成功挂出的数量
+
+        replace_all时先用一个请求撤掉该交易对的全部挂单再批量挂单，撤单失败时不挂任何订单。
+        """
+        # 整个网格只查询一次价格精度，再逐档取整
+        tick_size = await self.backpack_api.get_tick_size(self.symbol)
+        orders = []
+        for index, side in levels:
+            orders.append({
+                "symbol": self.symbol,
+                "side": "BUY" if side == GridLadder.BUY else "SELL",
+                "quantity": self.quantity,
+                "order_type": "LIMIT",
+                "price": BackpackAPI.round_to_tick(self.ladder.prices[index], tick_size),
+                "client_id": str(uuid.uuid4())
+            })
+        if replace_all:
+            results = await self.backpack_api.cancel_replace(
+                self.symbol, [(None, order) for order in orders], replace_all=True
+            )
+        else:
+            results = await self.backpack_api.place_orders(orders)
+
+        placed = 0
+        for (index, side), order in zip(levels, orders):
+            result = results.get(order["client_id"], {})
+            order_id = result.get("id") or result.get("orderId")
+            if order_id is None:
+                logger.error(f"{self.symbol} 网格第{index}档挂单失败: {result.get('error')}")
+                continue
+            self.ladder.assign(index, side, str(order_id))
+            placed += 1
+        return placed
+
+    async def start_grid(self) -> bool:
+        """撤掉遗留订单并按当前价格铺设网格"""
+        price = await self.backpack_api.get_price(self.symbol)
+        if price <= 0:
+            logger.error(f"{self.symbol} 获取价格失败，无法铺设网格")
+            return False
+        if self.quantity <= 0:
+            logger.error(f"{self.symbol} 网格每档数量未配置")
+            return False
+
+        lower, upper = self.lower, self.upper
+        if lower <= 0 or upper <= lower:
+            lower = price * (1 - self.range_percentage / 100)
+            upper = price * (1 + self.range_percentage / 100)
+        self.ladder = GridLadder(lower, upper, self.levels, self.spacing)
+        self.last_price = price
+        self.bought_levels.clear()
+
+        # 撤掉遗留订单和铺设新网格合并为撤销全部加批量挂单两次往返
+        orders = self.ladder.initial_orders(price)
+        placed = await self.place_levels(orders, replace_all=True)
+        if placed == 0:
+            logger.error(f"{self.symbol} 网格挂单全部失败，稍后重试")
+            self.ladder = None
+            return False
+
+        message = (
+            f"🕸️ {self.symbol} 网格已启动\n"
+            f"📉 区间: {lower:.6g} - {upper:.6g} USDC\n"
+            f"🔢 档位: {len(self.ladder)} ({self.spacing})\n"
+            f"💰 每档数量: {self.quantity}\n"
+            f"📌 已挂单: {placed}/{len(orders)}"
+        )
+        await self.telegram.send_message(message)
+        logger.info(f"{self.symbol} 网格已启动，区间 {lower:.6g}-{upper:.6g}，挂单 {placed}/{len(orders)}")
+        return True
+
+    async def on_fill(self, index: int):
+        """档位订单成交后，在相邻档位挂反向订单"""
+        ladder = self.ladder
+        side = ladder.sides[index]
+        ladder.release(index)
+        self.fills += 1
+
+        if side == GridLadder.BUY:
+            target, target_side = index + 1, GridLadder.SELL
+        else:
+            target, target_side = index - 1, GridLadder.BUY
+            if index in self.bought_levels:
+                # 卖出的是下一档买入的数量，完成一次低买高卖；初始卖单没有对应的买入，不计利润
+                self.bought_levels.discard(index)
+                self.round_trips += 1
+                self.grid_profit += (ladder.prices[index] - ladder.prices[index - 1]) * self.quantity
+
+        if 0 <= target < len(ladder) and ladder.sides[target] == GridLadder.EMPTY:
+            if await self.place_level(target, target_side) and target_side == GridLadder.SELL:
+                self.bought_levels.add(target)
+        logger.info(
+            f"{self.symbol} 网格第{index}档{'买入' if side == GridLadder.BUY else '卖出'}成交 "
+            f"@ {ladder.prices[index]:.6g}，累计成交 {self.fills} 次，网格利润 {self.grid_profit:.4f} USDC"
+        )
+
+    async def step(self):
+        """处理成交：账户推送在线时检查全部挂单的推送状态，否则只查询被越过的档位"""
+        if self.ladder is None:
+            # 铺设失败后5秒内不重试，由调度器定时唤醒
+            if time.time() < self.retry_start_at:
+                return
+            if not await self.start_grid():
+                self.retry_start_at = time.time() + 5
+                self.bot.scheduler.schedule(self.symbol, "retry", 5)
+            return
+
+        account_live = self.backpack_api.is_account_stream_live()
+        if account_live:
+            candidates = list(self.ladder.orders.values())
+        else:
+            if not (self.bot.stream_enabled and self.backpack_api.is_price_fresh(self.symbol)):
+                # 价格推送不可用，用REST价格判断上次检查以来越过的档位
+                price = await self.backpack_api.get_price(self.symbol)
+                if price > 0:
+                    self.track_price(price)
+            candidates = sorted(self.pending_checks)
+        if account_live:
+            self.pending_checks.clear()
+
+        for index in candidates:
+            order_id = self.ladder.order_ids[index]
+            if order_id is None:
+                self.pending_checks.discard(index)
+                continue
+            status = await self.backpack_api.lookup_order_status(self.symbol, order_id, query=not account_live)
+            # 被越过的档位在订单到达终结状态前保留在待确认集合中，成交可能晚于价格越线
+            if status in BackpackAPI.ORDER_FINAL_STATUSES:
+                self.pending_checks.discard(index)
+            if status == "Filled":
+                await self.on_fill(index)
+            elif status in ("Cancelled", "Expired"):
+                # 被交易所或人工撤销的档位重新挂单
+                side = self.ladder.sides[index]
+                self.ladder.release(index)
+                await self.place_level(index, side)
+
+    async def run(self):
+        """网格交易循环，异常只影响本交易对"""
+        loop_errors = 0
+        logger.info(f"{self.symbol} 网格交易循环已启动")
+
+        while self.bot.is_running:
+            try:
+                await self.step()
+                loop_errors = 0
+                await self.bot.scheduler.wait(self.symbol, self.bot.check_interval)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.symbol} 网格交易循环异常: {str(e)}")
+                logger.error(traceback.format_exc())
+                delay = self.error_backoff.backoff(loop_errors)
+                loop_errors += 1
+                await asyncio.sleep(delay)
+
+        logger.info(f"{self.symbol} 网格交易循环已停止")
+
+class TradingBot:
+    def __init__(self, config: dict):
+        self.config = config
+        self.backpack_api = BackpackAPI(
+            api_key=config["backpack"]["api_key"],
+            api_secret=config["backpack"]["api_secret"],
+            base_url=config["backpack"]["base_url"],
+            ws_url=config["backpack"]["ws_url"],
+            logger=logger,
+            network_options=config.get("network"),
+            rate_limit_options=config.get("rate_limit"),
+            cache_ttls=config.get("cache"),
+            retry_options=config.get("retry"),
+            breaker_options=config.get("circuit_breaker"),
+            clock_options=config.get("clock"),
+            price_max_age=config.get("stream", {}).get("max_price_age", 3),
+            orderbook_depth=config.get("stream", {}).get("orderbook_depth", 100),
+            price_history_size=config.get("stream", {}).get("history_size", 1024),
+            stream_options=config.get("stream"),
+            candle_options=config.get("candles")
+        )
+        self.telegram = TelegramBot(
+            token=config["telegram"]["token"],
+            chat_id=config["telegram"]["chat_id"]
+        )
+        self.is_running = False
+        self.task = None
+        self.check_interval = 10  # 默认检查间隔(秒)
+        # WebSocket价格流在线时，止盈止损直接读取内存中的价格，检查间隔缩短
+        stream_config = config.get("stream", {})
+        self.stream_enabled = stream_config.get("enabled", True)
+        self.stream_check_interval = stream_config.get("check_interval", 1)
+        # 本地订单簿只供按深度定价的下单(place_order_with_depth)使用，现有策略不读取，默认不订阅深度
+        self.orderbook_enabled = stream_config.get("orderbook", False)
+        self.stop_price_age = min(stream_config.get("max_price_age", 3), MAX_STOP_PRICE_AGE)
+        # 账户推送在线时通过推送确认成交，持仓查询只用于定期对账
+        self.account_stream_enabled = stream_config.get("account", True)
+        self.fill_timeout = stream_config.get("fill_timeout", 10)
+        self.reconcile_interval = stream_config.get("reconcile_interval", 300)
+        self.last_reconcile = time.time()
+        self.health_check_interval = 300  # 健康检查间隔(秒)
+        self.last_health_check = time.time()
+        self.scheduler = WakeupScheduler()
+        # 状态日志在构造时读取，交易循环启动时直接恢复，不必等待REST查询
+        journal_config = config.get("journal", {})
+        self.journal = StateJournal(journal_config) if journal_config.get("enabled", True) else None
+        # 资金费率扫描，超过阈值的市场发布给交易循环；avoid_paying时多头需支付费率的交易对暂不开多
+        funding_config = config.get("funding", {})
+        self.funding_scanner = None
+        if funding_config.get("enabled", False):
+            self.funding_scanner = FundingScanner(self.backpack_api, funding_config)
+            self.funding_scanner.register_callback(self.on_funding_candidates)
+        self.avoid_paying_funding = funding_config.get("avoid_paying", False)
+        self.funding_candidates = []
+
+        # 每个交易对一个独立的交易循环，共享API客户端、价格缓存和限流器
+        self.symbols = trading_symbols(config)
+        overrides = config["trading"].get("overrides", {})
+        self.workers = {}
+        for symbol in self.symbols:
+            trading_config = dict(config["trading"])
+            trading_config.update(overrides.get(symbol, {}))
+            if trading_config.get("strategy", "long") == "grid":
+                self.workers[symbol] = GridWorker(self, symbol, trading_config)
+            else:
+                self.workers[symbol] = SymbolWorker(self, symbol, trading_config)
+        self.worker_tasks = []
+
+    async def initialize(self):
+        """初始化交易机器人"""
+        try:
+            await self.backpack_api.initialize(warm_up=True)
+            self.backpack_api.start_metrics_reporter(
+                interval=self.config.get("metrics", {}).get("report_interval", 300)
+            )
+            if self.stream_enabled:
+                await self.backpack_api.start_ws_price_stream(self.symbols)
+                if self.orderbook_enabled:
+                    for symbol in self.symbols:
+                        await self.backpack_api.start_orderbook(symbol)
+                if self.account_stream_enabled:
+                    await self.backpack_api.start_account_stream()
+                self.backpack_api.register_price_callback(self.on_price)
+                self.backpack_api.register_account_callback(self.on_account_event)
+            logger.info(f"交易机器人已初始化，交易对: {self.symbols}，连接池: {self.backpack_api.pool_stats()}")
+            await self.telegram.send_message("🤖 交易机器人已启动")
+            return True
+        except Exception as e:
+            logger.error(f"初始化交易机器人异常: {str(e)}")
+            logger.error(traceback.format_exc())
+            await self.telegram.send_error_message("交易机器人初始化失败", str(e))
+            return False
+
+    async def stop(self):
+        """停止交易机器人"""
+        self.is_running = False
+        for task in [self.task] + self.worker_tasks:
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.worker_tasks = []
+        self.scheduler.close()
+        if self.funding_scanner is not None:
+            await self.funding_scanner.stop()
+        if self.journal is not None:
+            await self.journal.close()
+        await self.backpack_api.close()
+        await self.telegram.send_message("🛑 交易机器人已停止")
+        logger.info("交易机器人已停止")
+
+    async def health_check(self) -> bool:
+        """健康检查，确保API连接正常"""
+        try:
+            # 检查账户余额
+            balances = await self.backpack_api.get_balances(priority=PRIORITY_BACKGROUND)
+            if not balances and not isinstance(balances, list):
+                logger.warning("健康检查: 获取余额失败")
+                return False
+                
+            # 检查市场价格
+            for symbol in self.symbols:
+                price = await self.backpack_api.get_price(symbol, priority=PRIORITY_BACKGROUND)
+                if price <= 0:
+                    logger.warning(f"健康检查: 获取{symbol}价格失败")
+                    return False
+                
+            # 检查持仓信息
+            positions = await self.backpack_api.get_positions(priority=PRIORITY_BACKGROUND)
+            if not isinstance(positions, list):
+                logger.warning("健康检查: 获取持仓信息失败")
+                return False
+                
+            logger.info(
+                f"健康检查: API连接正常，连接池: {self.backpack_api.pool_stats()}，"
+                f"限流: {self.backpack_api.scheduler_stats()}，"
+                f"请求合并: {self.backpack_api.single_flight_stats()}，"
+                f"缓存: {self.backpack_api.cache_stats()}，"
+                f"熔断: {self.backpack_api.resilience_stats()}，"
+                f"时钟: {self.backpack_api.clock.stats()}，"
+                f"唤醒: {self.scheduler.wakeups}，"
+                f"状态日志: {self.journal.stats() if self.journal is not None else '未启用'}，"
+                f"资金费率: {self.funding_scanner.stats() if self.funding_scanner is not None else '未启用'}"
+            )
+            return True
+            
+        except Exception as e:
+            logger.error(f"健康检查异常: {str(e)}")
+            logger.error(traceback.format_exc())
+            return False
+
+    def on_price(self, symbol: str, price: float):
+        """价格推送回调，交给对应交易对判断是否越线"""
+        worker = self.workers.get(symbol)
+        if worker is not None:
+            worker.on_price(price)
+
+    def on_account_event(self, event: str, symbol: str):
+        """账户推送回调，订单或持仓变化时唤醒对应交易对"""
+        if symbol in self.workers:
+            self.scheduler.wake(symbol, "account")
+
+    async def on_funding_candidates(self, candidates: List[dict]):
+        """资金费率扫描回调：记录候选市场，新出现的候选发送通知，并唤醒受影响的交易对"""
+        previous = {candidate["symbol"] for candidate in self.funding_candidates}
+        self.funding_candidates = candidates
+        new = [candidate for candidate in candidates if candidate["symbol"] not in previous]
+        if new:
+            lines = [
+                f"{candidate['symbol']}: {candidate['rate'] * 100:+.4f}% ({'空头' if candidate['receiver'] == 'SHORT' else '多头'}收取)"
+                for candidate in new
+            ]
+            await self.telegram.send_message("💸 资金费率超过阈值\n" + "\n".join(lines))
+        if self.avoid_paying_funding:
+            for symbol in self.symbols:
+                self.scheduler.wake(symbol, "funding")
+
+    def funding_blocks_long(self, symbol: str) -> bool:
+        """多头需要支付超过阈值的资金费率时，是否暂停开多"""
+        if not self.avoid_paying_funding or self.funding_scanner is None:
+            return False
+        rate = self.funding_scanner.rate(symbol)
+        return rate is not None and rate >= self.funding_scanner.threshold
+
+    async def get_usable_balance(self) -> float:
+        """获取可用的USDC余额，读取失败时抛出AccountReadError，不当作零余额"""
+        try:
+            # 余额由API客户端按TTL缓存，下单后自动失效；余额决定开仓数量，按下单优先级读取
+            balances = await self.backpack_api.get_balances(priority=PRIORITY_ORDER, raise_on_error=True)
+            for balance in balances:
+                if balance["asset"] == "USDC":
+                    return float(balance["available"])
+            return 0
+        except AccountReadError:
+            raise
+        except Exception as e:
+            logger.error(f"获取余额异常: {str(e)}")
+            logger.error(traceback.format_exc())
+            return 0
+
+    async def allocated_balance(self) -> float:
+        """单个交易对可用于开仓的余额，可用余额在尚未持仓的交易对之间平分"""
+        balance = await self.get_usable_balance()
+        waiting = sum(1 for worker in self.workers.values() if not worker.has_position and not worker.in_cooldown)
+        return balance / max(1, waiting)
+
+    async def wait_for_fill(self, order_result: dict) -> Optional[dict]:
+        """等待订单成交确认，返回订单最终状态；账户推送不可用时退回固定等待并返回None"""
+        if order_result.get("status") in BackpackAPI.ORDER_FINAL_STATUSES:
+            return order_result
+        if not self.backpack_api.is_account_stream_live():
+            await asyncio.sleep(5)  # 等待订单成交
+            return None
+        return await self.backpack_api.wait_for_order(order_result["orderId"], timeout=self.fill_timeout)
+
+    @staticmethod
+    def fill_price(order: Optional[dict], default: float) -> float:
+        """根据成交额和成交量计算成交均价"""
+        if not order:
+            return default
+        executed = float(order.get("executedQuantity") or 0)
+        if executed <= 0:
+            return default
+        return float(order.get("executedQuoteQuantity") or 0) / executed or default
+
     async def trading_loop(self):
-        """交易主循环"""
+        """交易主循环：启动各交易对的交易循环，并负责共享的健康检查和持仓对账"""
         if not await self.initialize():
             logger.error("交易机器人初始化失败，无法启动交易循环")
             return
@@ -652,17 +1667,23 @@ class TradingBot:
         self.is_running = True
         
         # 发送启动通知
+        trading_config = self.config["trading"]
         startup_message = (
             f"🔄 交易机器人运行中\n"
-            f"📈 交易对: {self.symbol}\n"
-            f"⚙️ 杠杆倍数: {self.leverage}x\n"
-            f"🔼 止盈比例: {self.profit_percentage}%\n"
-            f"🔽 止损比例: {self.stop_loss_percentage}%\n"
-            f"⏱️ 冷静期: {self.cooldown_minutes}分钟"
+            f"📈 交易对: {', '.join(self.symbols)}\n"
+            f"🧭 策略: {trading_config.get('strategy', 'long')}\n"
+            f"⚙️ 杠杆倍数: {trading_config['leverage']}x\n"
+            f"🔼 止盈比例: {trading_config['profit_percentage']}%\n"
+            f"🔽 止损比例: {trading_config['stop_loss_percentage']}%\n"
+            f"⏱️ 冷静期: {trading_config['cooldown_minutes']}分钟"
         )
         await self.telegram.send_message(startup_message)
-        
-        has_position = False
+
+        if self.journal is not None:
+            self.journal.start()
+        if self.funding_scanner is not None:
+            self.funding_scanner.start()
+        self.worker_tasks = [asyncio.create_task(worker.run()) for worker in self.workers.values()]
         consecutive_errors = 0
         
         while self.is_running:
@@ -681,104 +1702,26 @@ class TradingBot:
                                 "API连接问题", 
                                 "连续3次健康检查失败，但机器人将继续尝试运行。请检查API状态和网络连接。"
                             )
-                            # 增加检查间隔，避免频繁失败通知
-                            self.check_interval = min(60, self.check_interval * 2)
                     else:
                         consecutive_errors = 0
-                        # 恢复正常检查间隔
-                        self.check_interval = 10
                         
                     self.last_health_check = current_time
-                
-                # 检查是否在冷静期
-                if self.in_cooldown:
-                    if current_time >= self.cooldown_until:
-                        self.in_cooldown = False
-                        await self.telegram.send_message("✅ 冷静期结束，恢复交易")
-                        logger.info("冷静期结束，恢复交易")
-                    else:
-                        remaining_minutes = int((self.cooldown_until - current_time) / 60)
-                        if remaining_minutes % 5 == 0:  # 每5分钟记录一次
-                            logger.info(f"冷静期中，剩余{remaining_minutes}分钟")
-                        await asyncio.sleep(60)  # 每分钟检查一次
-                        continue
-                
-                # 检查是否有持仓
-                if current_time - self.last_position_check >= 30:  # 每30秒检查一次持仓
-                    position = await self.backpack_api.get_position(self.symbol)
-                    has_position = position and float(position.get("quantity", 0)) > 0
-                    self.last_position_check = current_time
-                    
-                    # 如果API返回了持仓信息，更新本地记录
-                    if has_position:
-                        self.entry_price = float(position.get("entryPrice", self.entry_price))
-                        self.position_size = float(position.get("quantity", self.position_size))
-                
-                if not has_position:
-                    # 没有持仓，且不在冷静期，开仓
-                    if not self.in_cooldown:
-                        logger.info("没有持仓，准备开仓...")
-                        success = await self.open_long_position()
-                        if success:
-                            has_position = True
-                        await asyncio.sleep(5)  # 等待订单成交
-                else:
-                    # 有持仓，检查止盈止损
-                    if current_time - self.last_price_check >= self.check_interval:
-                        current_price = await self.backpack_api.get_price(self.symbol)
-                        self.last_price_check = current_time
-                        
-                        if current_price <= 0:
-                            logger.warning(f"获取{self.symbol}价格失败，跳过本次检查")
-                            continue
-                        
-                        # 确保有有效的入场价
-                        if self.entry_price <= 0:
-                            position = await self.backpack_api.get_position(self.symbol)
-                            if position and "entryPrice" in position:
-                                self.entry_price = float(position["entryPrice"])
-                            else:
-                                logger.warning("无法获取有效的入场价格，跳过本次检查")
-                                continue
-                        
-                        # 计算盈亏比例
-                        profit_percentage = (current_price - self.entry_price) / self.entry_price * 100
-                        
-                        # 日志记录当前状态
-                        logger.info(f"当前持仓: {self.symbol}, 入场价: {self.entry_price}, 当前价: {current_price}, 盈亏: {profit_percentage:.2f}%")
-                        
-                        # 检查止盈
-                        if profit_percentage >= self.profit_percentage:
-                            logger.info(f"达到止盈条件 (+{profit_percentage:.2f}%)，准备平仓...")
-                            await self.close_position("止盈")
-                            has_position = False
-                            await asyncio.sleep(5)  # 等待订单成交
-                        
-                        # 检查止损
-                        elif profit_percentage <= -self.stop_loss_percentage:
-                            logger.info(f"达到止损条件 ({profit_percentage:.2f}%)，准备平仓...")
-                            await self.close_position("止损")
-                            has_position = False
-                            await asyncio.sleep(5)  # 等待订单成交
-                
-                # 等待下一次检查
-                await asyncio.sleep(self.check_interval)
-                
+
+                # 账户推送在线时持仓由推送维护，定期与REST对账
+                if (self.backpack_api.is_account_stream_live()
+                        and current_time - self.last_reconcile >= self.reconcile_interval):
+                    await self.backpack_api.sync_positions()
+                    self.last_reconcile = current_time
+
             except Exception as e:
-                logger.error(f"交易循环异常: {str(e)}")
+                logger.error(f"交易主循环异常: {str(e)}")
                 logger.error(traceback.format_exc())
-                
-                consecutive_errors += 1
-                if consecutive_errors >= 3:
-                    await self.telegram.send_error_message(
-                        "交易循环异常", 
-                        f"连续{consecutive_errors}次出现异常: {str(e)}\n机器人将继续尝试运行。"
-                    )
-                    # 减少通知频率
-                    consecutive_errors = 0
-                
-                # 发生异常后增加等待时间
-                await asyncio.sleep(30)
+
+            # 睡到下一个健康检查或对账时间点，账户推送恢复后最多30秒内对账
+            next_due = self.last_health_check + self.health_check_interval
+            if self.backpack_api.is_account_stream_live():
+                next_due = min(next_due, self.last_reconcile + self.reconcile_interval)
+            await asyncio.sleep(min(30.0, max(1.0, next_due - time.time())))
         
         logger.info("交易循环已停止")
 
@@ -923,6 +1866,12 @@ class App:
         symbol = input(f"请输入交易对 [{self.config['trading']['symbol']}]: ")
         if symbol:
             self.config['trading']['symbol'] = symbol.upper()
+
+        # 同时交易多个交易对
+        current_symbols = ",".join(trading_symbols(self.config))
+        symbols = input(f"请输入同时交易的交易对，逗号分隔 [{current_symbols}]: ")
+        if symbols:
+            self.config['trading']['symbols'] = [s.strip().upper() for s in symbols.split(",") if s.strip()]
             
         # 杠杆倍数
         while True:
@@ -1088,7 +2037,13 @@ class App:
                 api_secret=self.config["backpack"]["api_secret"],
                 base_url=self.config["backpack"]["base_url"],
                 ws_url=self.config["backpack"]["ws_url"],
-                logger=logger
+                logger=logger,
+                network_options=self.config.get("network"),
+                rate_limit_options=self.config.get("rate_limit"),
+                cache_ttls=self.config.get("cache"),
+                retry_options=self.config.get("retry"),
+                breaker_options=self.config.get("circuit_breaker"),
+                clock_options=self.config.get("clock")
             )
             
             try:
@@ -86,6 +86,7 @@ trap 'rm -rf "$TEMP_DIR"' EXIT
 # 下载最新的机器人代码
 echo -e "  正在下载最新版本的机器人代码..."
 curl -s -L -o "$TEMP_DIR/backpack_bot.py" https://raw.githubusercontent.com/yinghao888/grid-trading-bot/main/backpack_bot.py || error_exit "下载机器人代码失败"
+curl -s -L -o "$TEMP_DIR/backpack_api_impl.py" https://raw.githubusercontent.com/yinghao888/grid-trading-bot/main/backpack_api_impl.py || error_exit "下载交易所API代码失败"
 echo -e "  ✓ 机器人代码下载完成"
 
 # 创建配置目录
@@ -160,11 +161,11 @@ python3 -m pip install --upgrade pip || {
 }
 
 # 使用pip安装所需的Python包
-python3 -m pip install --user aiohttp requests || {
+python3 -m pip install --user aiohttp websockets requests || {
     echo -e "${YELLOW}⚠ pip安装失败，尝试使用easy_install...${NC}"
     # 如果pip安装失败，尝试使用easy_install
     $SUDO_CMD apt-get install -y python3-setuptools -qq
-    easy_install3 --user aiohttp requests || error_exit "无法安装Python依赖"
+    easy_install3 --user aiohttp websockets requests || error_exit "无法安装Python依赖"
 }
 echo -e "  ✓ Python依赖安装成功"
 
@@ -229,6 +230,7 @@ echo -e "${BLUE}[4/5] 正在设置文件...${NC}"
 
 # 复制主程序文件到配置目录
 cp "$TEMP_DIR/backpack_bot.py" "$CONFIG_DIR/"
+cp "$TEMP_DIR/backpack_api_impl.py" "$CONFIG_DIR/"
 chmod +x "$CONFIG_DIR/backpack_bot.py"
 echo -e "  ✓ 已复制主程序文件到配置目录"
 
@@ -41,7 +41,7 @@ sudo npm install pm2 -g
 
 # 安装Python依赖
 echo "正在安装Python依赖..."
-pip3 install aiohttp requests
+pip3 install aiohttp websockets requests
 
 # 检查安装结果
 if [ $? -ne 0 ]; then